@@ -0,0 +1,44 @@
+"""
+Compare the per-object birthday loop with the vectorized NumPy implementation
+
+Run from the project root: ``python -m benchmarks.birthdays``
+"""
+import datetime
+import time
+
+import numpy as np
+
+from src.database.models import Contact
+from src.repository.contacts import nearest_bdays
+from src.services.birthdays import upcoming_birthdays
+
+SIZES = (10_000, 100_000, 1_000_000)
+TODAY = datetime.date(2024, 2, 25)
+
+
+def best_of(func, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    rng = np.random.default_rng(42)
+    print(f"{'rows':>10} {'loop, s':>10} {'numpy, s':>10} {'speedup':>8}")
+    for size in SIZES:
+        user_ids = rng.integers(1, size // 100 + 2, size=size)
+        birth_dates = np.datetime64('1950-01-01') + rng.integers(0, 365 * 60, size=size).astype('timedelta64[D]')
+        contacts = [Contact(user_id=int(user_id), birth_date=day)
+                    for user_id, day in zip(user_ids, birth_dates.tolist())]
+
+        loop = best_of(lambda: nearest_bdays(contacts, 7, TODAY))
+        vectorized = best_of(lambda: upcoming_birthdays(user_ids, birth_dates, 7, TODAY))
+        assert len(nearest_bdays(contacts, 7, TODAY)) == len(upcoming_birthdays(user_ids, birth_dates, 7, TODAY))
+        print(f"{size:>10} {loop:>10.4f} {vectorized:>10.4f} {loop / vectorized:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Measure password hash latency per scheme and cost setting on the current host
+
+Run from the project root: ``python -m benchmarks.password_hashing --target-p99-ms 250``.
+Use ``--concurrency`` equal to PASSWORD_HASH_WORKERS to see latency under a login storm.
+The strongest setting of every scheme whose p99 fits the target is printed as a recommendation.
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.services.passwords import build_context
+
+CANDIDATES = [
+    ('bcrypt', {'bcrypt_rounds': rounds}) for rounds in (10, 11, 12, 13, 14)
+] + [
+    ('argon2', {'argon2_time_cost': time_cost, 'argon2_memory_cost': memory_cost, 'argon2_parallelism': parallelism})
+    for memory_cost, parallelism in ((19456, 1), (65536, 4)) for time_cost in (2, 3, 4)
+]
+DEFAULTS = {'bcrypt_rounds': 12, 'argon2_time_cost': 3, 'argon2_memory_cost': 65536, 'argon2_parallelism': 4}
+
+
+def measure(context, samples: int, concurrency: int) -> list[float]:
+    def timed(_):
+        start = time.perf_counter()
+        context.hash("benchmark-password")
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(timed, range(samples)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Password hashing latency per setting')
+    parser.add_argument('--target-p99-ms', type=float, default=250)
+    parser.add_argument('--samples', type=int, default=30)
+    parser.add_argument('--concurrency', type=int, default=1)
+    args = parser.parse_args()
+
+    best = {}
+    print(f"{'scheme':<8} {'parameters':<72} {'p50, ms':>9} {'p99, ms':>9}")
+    for scheme, parameters in CANDIDATES:
+        context = build_context([scheme], **{**DEFAULTS, **parameters})
+        latencies = sorted(measure(context, args.samples, args.concurrency))
+        p50 = statistics.median(latencies)
+        p99 = latencies[min(len(latencies) - 1, round(0.99 * (len(latencies) - 1)))]
+        fits = p99 <= args.target_p99_ms
+        if fits:
+            best[scheme] = parameters
+        description = ', '.join(f'{key}={value}' for key, value in parameters.items())
+        print(f"{scheme:<8} {description:<72} {p50:>9.1f} {p99:>9.1f} {'ok' if fits else ''}")
+
+    print()
+    for scheme, parameters in best.items():
+        print(f"Recommended {scheme}: " + ' '.join(f'{key.upper()}={value}' for key, value in parameters.items()))
+
+
+if __name__ == '__main__':
+    main()
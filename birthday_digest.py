@@ -0,0 +1,110 @@
+"""
+Daily upcoming birthday digest for all users
+
+Run once a day, e.g. from cron: ``python birthday_digest.py --days 7``.
+Progress is saved after every user, so a crashed run started again on the
+same day continues with the next user. Recipients refused by the mail server
+are skipped.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import pathlib
+from itertools import groupby
+
+from src.database.db import AsyncDBSession
+from src.repository import contacts as repos_contacts
+from src.services.email import send_birthday_digests
+
+
+def load_checkpoint(path: pathlib.Path, today: datetime.date) -> int:
+    """
+    Read id of the last user whose digest was sent today
+
+    :param path: Checkpoint file
+    :type path: pathlib.Path
+    :param today: Date of the run
+    :type today: datetime.date
+    :return: user id, 0 when nothing was sent today
+    :rtype: int
+    """
+    if path.exists():
+        checkpoint = json.loads(path.read_text())
+        if checkpoint.get('date') == today.isoformat():
+            return checkpoint['last_user_id']
+    return 0
+
+
+def save_checkpoint(path: pathlib.Path, today: datetime.date, last_user_id: int) -> None:
+    """
+    Atomically store id of the last user whose digest was sent
+
+    :param path: Checkpoint file
+    :type path: pathlib.Path
+    :param today: Date of the run
+    :type today: datetime.date
+    :param last_user_id: ID of the last processed user
+    :type last_user_id: int
+    :return: None
+    """
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps({'date': today.isoformat(), 'last_user_id': last_user_id}))
+    tmp_path.replace(path)
+
+
+def build_digests(rows) -> list[dict]:
+    """
+    Group rows ordered by user id into one digest per user
+
+    :param rows: Rows returned by get_nearest_bdays_of_all_users
+    :return: Digests with user id, email, username and contacts
+    :rtype: list[dict]
+    """
+    digests = []
+    for user_id, user_rows in groupby(rows, key=lambda row: row.user_id):
+        user_rows = list(user_rows)
+        digests.append({
+            'user_id': user_id,
+            'email': user_rows[0].user_email,
+            'username': user_rows[0].username,
+            'contacts': [{'first_name': row.first_name,
+                          'last_name': row.last_name,
+                          'birth_date': row.birth_date.strftime('%d.%m')} for row in user_rows],
+        })
+    return digests
+
+
+async def run(days: int, batch_size: int, checkpoint: pathlib.Path) -> None:
+    """
+    Send birthday digests to every confirmed user with upcoming birthdays
+
+    :param days: Length of the birthday range in days
+    :type days: int
+    :param batch_size: Number of emails sent over one SMTP connection
+    :type batch_size: int
+    :param checkpoint: Checkpoint file
+    :type checkpoint: pathlib.Path
+    :return: None
+    """
+    today = datetime.date.today()
+    last_user_id = load_checkpoint(checkpoint, today)
+    async with AsyncDBSession() as db:
+        rows = await repos_contacts.get_nearest_bdays_of_all_users(db, days, last_user_id)
+    digests = build_digests(rows)
+    for start in range(0, len(digests), batch_size):
+        batch = digests[start:start + batch_size]
+        sent = await send_birthday_digests(batch, days,
+                                           lambda digest: save_checkpoint(checkpoint, today, digest['user_id']))
+        print(f"Processed {start + len(batch)}/{len(digests)} users, sent {sent}/{len(batch)} digests of the batch, "
+              f"last user id {batch[-1]['user_id']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Email every user their upcoming birthdays')
+    parser.add_argument('--days', type=int, default=7, help='length of the birthday range in days')
+    parser.add_argument('--batch-size', type=int, default=100, help='emails sent over one SMTP connection')
+    parser.add_argument('--checkpoint', type=pathlib.Path, default=pathlib.Path('birthday_digest.checkpoint.json'),
+                        help='file used to resume an interrupted run')
+    args = parser.parse_args()
+    asyncio.run(run(args.days, args.batch_size, args.checkpoint))
@@ -1,14 +1,23 @@
 
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+
+from fastapi import FastAPI, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from fastapi_limiter import FastAPILimiter
-import redis.asyncio as redis
 
 from fastapi.middleware.cors import CORSMiddleware
 
 from src.confg.config import settings
-from src.database.db import get_db
+from src.database.db import get_db, pool_monitors
+from src.database.slow_query import RequestScopeMiddleware
+from src.services.autocomplete import autocomplete_index
+from src.services.cache import get_redis, close_redis
+from src.services.jwt_keys import key_ring
+from src.services.passwords import password_hasher
+from src.services.principal_cache import principal_cache
+from src.services.revocation import revocation_list
+from src.services.token_cache import token_cache
 from src.routes import users, contacts
 
 
@@ -18,12 +27,28 @@ app = FastAPI()
 @app.on_event("startup")
 async def startup():
     """
-    Set limitation of requests on server
+    Create shared Redis connection pool, set limitation of requests on server
+    and start listening for principal cache invalidations, revoked tokens and contact changes
+
+    :return: None
+    """
+    await FastAPILimiter.init(get_redis())
+    app.state.principal_listener = asyncio.create_task(principal_cache.listen())
+    app.state.revocation_listener = asyncio.create_task(revocation_list.listen())
+    app.state.autocomplete_listener = asyncio.create_task(autocomplete_index.listen())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    Stop Redis listeners and close shared Redis connection pool
 
     :return: None
     """
-    r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
-    await FastAPILimiter.init(r)
+    app.state.principal_listener.cancel()
+    app.state.revocation_listener.cancel()
+    app.state.autocomplete_listener.cancel()
+    await close_redis()
 
 
 origins = [
@@ -37,6 +62,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Lets slow queries be attributed to the route of the request
+app.add_middleware(RequestScopeMiddleware)
 
 
 @app.get("/")
@@ -72,5 +99,63 @@ def healthchecker(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Error connecting to database")
 
 
+@app.get("/api/healthchecker/pool")
+async def pool_stats():
+    """
+    Reports connection pool usage of the database engines
+
+    :return: checkout, overflow and connection counters per engine
+    :rtype: dict
+    """
+    return {name: monitor.stats() for name, monitor in pool_monitors.items()}
+
+
+@app.get("/api/healthchecker/password_hashing")
+async def password_hashing_stats():
+    """
+    Reports queue depth and counters of the password hashing executor
+
+    :return: password hashing statistics
+    :rtype: dict
+    """
+    return password_hasher.stats()
+
+
+@app.get("/api/healthchecker/principal_cache")
+async def principal_cache_stats():
+    """
+    Reports size and hit/miss counters of the authenticated principal cache
+
+    :return: principal cache statistics
+    :rtype: dict
+    """
+    return principal_cache.stats()
+
+
+@app.get("/api/healthchecker/token_cache")
+async def token_cache_stats():
+    """
+    Reports size and hit/miss counters of the verified access token cache
+
+    :return: token cache statistics
+    :rtype: dict
+    """
+    return token_cache.stats()
+
+
+@app.get("/.well-known/jwks.json")
+async def jwks(response: Response):
+    """
+    Publishes public keys access tokens are signed with, so other services can verify them locally
+
+    :param response: Http response
+    :type response: Response
+    :return: JSON Web Key Set
+    :rtype: dict
+    """
+    response.headers["Cache-Control"] = f"public, max-age={settings.jwks_max_age}"
+    return key_ring.jwks()
+
+
 app.include_router(users.auth_router, prefix='/api')
 app.include_router(contacts.router, prefix='/api')
@@ -0,0 +1,23 @@
+"""Contacts user_id id index
+
+Revision ID: 3b9f6c1d2a47
+Revises: 87914c3e7541
+Create Date: 2026-10-16 09:12:40.318204
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9f6c1d2a47'
+down_revision = '87914c3e7541'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_contacts_user_id_id', 'contacts', ['user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_id', table_name='contacts')
@@ -0,0 +1,29 @@
+"""Contacts search indexes
+
+Revision ID: 5e1d7b9a0c23
+Revises: c52e8a4f7d10
+Create Date: 2026-10-16 13:05:27.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e1d7b9a0c23'
+down_revision = 'c52e8a4f7d10'
+branch_labels = None
+depends_on = None
+
+SEARCH_FIELDS = ('first_name', 'last_name', 'email', 'phone')
+
+
+def upgrade() -> None:
+    for field in SEARCH_FIELDS:
+        op.create_index(f'ix_contacts_user_id_lower_{field}', 'contacts',
+                        ['user_id', sa.text(f'lower({field}) text_pattern_ops')], unique=False)
+
+
+def downgrade() -> None:
+    for field in SEARCH_FIELDS:
+        op.drop_index(f'ix_contacts_user_id_lower_{field}', table_name='contacts')
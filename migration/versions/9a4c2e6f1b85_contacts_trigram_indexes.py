@@ -0,0 +1,32 @@
+"""Contacts trigram indexes
+
+Revision ID: 9a4c2e6f1b85
+Revises: 5e1d7b9a0c23
+Create Date: 2026-10-16 14:21:52.117630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4c2e6f1b85'
+down_revision = '5e1d7b9a0c23'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for field in ('first_name', 'last_name', 'email'):
+        op.create_index(f'ix_contacts_trgm_{field}', 'contacts', [sa.text(f'{field} gin_trgm_ops')],
+                        unique=False, postgresql_using='gin')
+    op.create_index('ix_contacts_trgm_phone_digits', 'contacts',
+                    [sa.text("regexp_replace(phone, '[^0-9]', '', 'g') gin_trgm_ops")],
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_trgm_phone_digits', table_name='contacts')
+    for field in ('first_name', 'last_name', 'email'):
+        op.drop_index(f'ix_contacts_trgm_{field}', table_name='contacts')
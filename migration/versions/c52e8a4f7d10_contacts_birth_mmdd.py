@@ -0,0 +1,45 @@
+"""Contacts birth_mmdd
+
+Revision ID: c52e8a4f7d10
+Revises: 3b9f6c1d2a47
+Create Date: 2026-10-16 11:40:03.582119
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52e8a4f7d10'
+down_revision = '3b9f6c1d2a47'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birth_mmdd', sa.Integer(), nullable=True))
+
+    mmdd = "EXTRACT(month FROM birth_date) * 100 + EXTRACT(day FROM birth_date)"
+    if context.is_offline_mode():
+        # Results are not available when only generating SQL, emit a single UPDATE
+        op.execute(f"UPDATE contacts SET birth_mmdd = {mmdd} WHERE birth_date IS NOT NULL")
+    else:
+        # Backfill id ranges, each committed on its own, to keep row locks and WAL bursts short
+        backfill = sa.text(
+            f"UPDATE contacts SET birth_mmdd = {mmdd} "
+            "WHERE id > :first_id AND id <= :last_id AND birth_date IS NOT NULL"
+        )
+        with op.get_context().autocommit_block():
+            connection = op.get_bind()
+            max_id = connection.execute(sa.text("SELECT max(id) FROM contacts")).scalar() or 0
+            for first_id in range(0, max_id, BATCH_SIZE):
+                connection.execute(backfill, {'first_id': first_id, 'last_id': first_id + BATCH_SIZE})
+
+    op.create_index('ix_contacts_user_id_birth_mmdd', 'contacts', ['user_id', 'birth_mmdd'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_birth_mmdd', table_name='contacts')
+    op.drop_column('contacts', 'birth_mmdd')
@@ -0,0 +1,25 @@
+"""Users case-insensitive unique email index
+
+Revision ID: d81f3a6b2c94
+Revises: 9a4c2e6f1b85
+Create Date: 2026-10-16 16:42:08.513276
+
+Fails if users already contain emails differing only in case, merge them first.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f3a6b2c94'
+down_revision = '9a4c2e6f1b85'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_users_lower_email', 'users', [sa.text('lower(email)')], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_lower_email', table_name='users')
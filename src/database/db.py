@@ -1,12 +1,17 @@
 import configparser
 import pathlib
+import time
 
 from fastapi import HTTPException, status
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 
 from src.confg.config import settings
+from src.database.slow_query import install_slow_query_log
 
 # Read config file
 file_config = pathlib.Path(__file__).parent.parent.joinpath('confg/config.ini')
@@ -17,12 +22,136 @@ config.read(file_config)
 
 # Create DB URI
 URI = settings.sqlalchemy_database_url
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+ASYNC_URI = make_url(URI).set(drivername=ASYNC_DRIVERS[make_url(URI).get_backend_name()])
+
+
+class TimedPoolMixin:
+    """
+    Measures how long getting a connection from the pool takes, including waiting for
+    a free connection and opening a new one
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - start
+            self.waits += 1
+            self.wait_seconds += elapsed
+            self.max_wait_seconds = max(self.max_wait_seconds, elapsed)
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_options(url, poolclass) -> dict:
+    """
+    Connection pool settings for the engine of the URL. SQLite engines use NullPool or
+    SingletonThreadPool, which do not accept the queue pool sizing options.
+
+    :param url: Database URL
+    :param poolclass: Queue pool class to use for other backends
+    :return: keyword arguments for create_engine
+    :rtype: dict
+    """
+    if make_url(url).get_backend_name() == 'sqlite':
+        return {}
+    return {
+        'poolclass': poolclass,
+        'pool_size': settings.db_pool_size,
+        'max_overflow': settings.db_max_overflow,
+        'pool_timeout': settings.db_pool_timeout,
+        'pool_recycle': settings.db_pool_recycle,
+        'pool_pre_ping': settings.db_pool_pre_ping,
+        'pool_use_lifo': settings.db_pool_use_lifo,
+    }
 
 
 # Create engine and session
-engine = create_engine(URI, echo=True)
+engine = create_engine(URI, echo=settings.db_echo, **pool_options(URI, TimedQueuePool))
 DBSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Create async engine and session for request handlers
+async_engine = create_async_engine(ASYNC_URI, echo=settings.db_echo,
+                                   **pool_options(ASYNC_URI, TimedAsyncAdaptedQueuePool))
+AsyncDBSession = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+if settings.slow_query_log:
+    install_slow_query_log(engine, settings.slow_query_threshold_ms)
+    install_slow_query_log(async_engine.sync_engine, settings.slow_query_threshold_ms)
+
+
+class PoolMonitor:
+    """
+    Collects checkout statistics of an engine's connection pool
+    """
+
+    def __init__(self, sync_engine):
+        self.engine = sync_engine
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        event.listen(sync_engine, 'connect', self._on_connect)
+        event.listen(sync_engine, 'checkout', self._on_checkout)
+        event.listen(sync_engine, 'checkin', self._on_checkin)
+        event.listen(sync_engine, 'invalidate', self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        self.checkins += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        """
+        Current pool occupancy, checkout wait times and event counters. Occupancy and wait
+        times are None for pools that do not track them, e.g. SQLite ones.
+
+        :return: pool statistics
+        :rtype: dict
+        """
+        pool = self.engine.pool
+        queued = isinstance(pool, QueuePool)
+        timed = isinstance(pool, TimedPoolMixin)
+        return {
+            'pool': type(pool).__name__,
+            'size': pool.size() if queued else None,
+            'checked_in': pool.checkedin() if queued else None,
+            'checked_out': pool.checkedout() if queued else None,
+            'overflow': pool.overflow() if queued else None,
+            'max_overflow': settings.db_max_overflow if queued else None,
+            'waits': pool.waits if timed else None,
+            'avg_wait_ms': pool.wait_seconds / pool.waits * 1000 if timed and pool.waits else None,
+            'max_wait_ms': pool.max_wait_seconds * 1000 if timed else None,
+            'connects': self.connects,
+            'checkouts': self.checkouts,
+            'checkins': self.checkins,
+            'invalidations': self.invalidations,
+        }
+
+
+pool_monitors = {'sync': PoolMonitor(engine), 'async': PoolMonitor(async_engine.sync_engine)}
+
 
 # Dependency
 def get_db():
@@ -34,3 +163,18 @@ def get_db():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
     finally:
         db.close()
+
+
+async def get_async_db():
+    """
+    Provides an async database session for a single request
+
+    :return: The async database session
+    :rtype: AsyncSession
+    """
+    async with AsyncDBSession() as db:
+        try:
+            yield db
+        except SQLAlchemyError as err:
+            await db.rollback()
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
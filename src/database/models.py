@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Index, DDL, event, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -7,6 +7,8 @@ from src.database.db import engine
 
 # Create parent base
 Base = declarative_base()
+event.listen(Base.metadata, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
 
 
 # Create base class
@@ -19,8 +21,30 @@ class Contact(Base):
     email = Column(String(length=25), index=True)
     phone = Column(String(length=13), index=True)
     birth_date = Column(DateTime, index=True)
+    birth_mmdd = Column(Integer, nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    user = relationship('User', backref="contacts")
+    user = relationship('User', backref="contacts", lazy="selectin")
+
+    __table_args__ = (
+        Index('ix_contacts_user_id_id', 'user_id', 'id'),
+        Index('ix_contacts_user_id_birth_mmdd', 'user_id', 'birth_mmdd'),
+        Index('ix_contacts_user_id_lower_first_name', 'user_id', func.lower(first_name).label('lower_first_name'),
+              postgresql_ops={'lower_first_name': 'text_pattern_ops'}),
+        Index('ix_contacts_user_id_lower_last_name', 'user_id', func.lower(last_name).label('lower_last_name'),
+              postgresql_ops={'lower_last_name': 'text_pattern_ops'}),
+        Index('ix_contacts_user_id_lower_email', 'user_id', func.lower(email).label('lower_email'),
+              postgresql_ops={'lower_email': 'text_pattern_ops'}),
+        Index('ix_contacts_user_id_lower_phone', 'user_id', func.lower(phone).label('lower_phone'),
+              postgresql_ops={'lower_phone': 'text_pattern_ops'}),
+        Index('ix_contacts_trgm_first_name', first_name, postgresql_using='gin',
+              postgresql_ops={'first_name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_contacts_trgm_last_name', last_name, postgresql_using='gin',
+              postgresql_ops={'last_name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_contacts_trgm_email', email, postgresql_using='gin',
+              postgresql_ops={'email': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_contacts_trgm_phone_digits', func.regexp_replace(phone, '[^0-9]', '', 'g').label('phone_digits'),
+              postgresql_using='gin', postgresql_ops={'phone_digits': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+    )
 
 
 class User(Base):
@@ -32,3 +56,7 @@ class User(Base):
     refresh_token = Column(String(255), nullable=True)
     confirmed = Column(Boolean, default=False)
     avatar = Column(String(255), nullable=True, unique=True)
+
+    __table_args__ = (
+        Index('ix_users_lower_email', func.lower(email), unique=True),
+    )
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+logger = logging.getLogger('sql.slow_query')
+
+# ASGI scope of the request currently being handled, set by the HTTP middleware in main.py.
+# The router adds the matched route to the scope after the middleware has run.
+request_scope: ContextVar[dict | None] = ContextVar('request_scope', default=None)
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(statement: str) -> str:
+    """
+    Normalize a SQL statement so that queries differing only in literals share one fingerprint
+
+    :param statement: SQL statement
+    :type statement: str
+    :return: short hash of the normalized statement
+    :rtype: str
+    """
+    normalized = WHITESPACE.sub(' ', LITERALS.sub('?', statement)).strip().lower()
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+class RequestScopeMiddleware:
+    """
+    Pure ASGI middleware remembering the scope of HTTP requests in ``request_scope``,
+    without wrapping the request and response streams
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        token = request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_scope.reset(token)
+
+
+def route_template(scope: dict | None) -> str | None:
+    """
+    Describe the matched route of a request by its path template, e.g. ``GET /api/contacts/{contact_id}``,
+    so that records of one endpoint share the same value
+
+    :param scope: ASGI scope of the request
+    :type scope: dict | None
+    :return: method and path template, or None outside of a matched route
+    :rtype: str | None
+    """
+    route = scope.get('route') if scope is not None else None
+    if route is None:
+        return None
+    return f"{scope['method']} {route.path}"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.query_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany, threshold_ms):
+    duration_ms = (time.perf_counter() - context.query_start_time) * 1000
+    if duration_ms < threshold_ms:
+        return
+    logger.warning(json.dumps({
+        'event': 'slow_query',
+        'fingerprint': fingerprint(statement),
+        'statement': WHITESPACE.sub(' ', statement).strip(),
+        'duration_ms': round(duration_ms, 3),
+        'rowcount': cursor.rowcount,
+        'route': route_template(request_scope.get()),
+    }))
+
+
+def install_slow_query_log(sync_engine, threshold_ms: float) -> None:
+    """
+    Log queries of the engine that run longer than the threshold as JSON records
+
+    :param sync_engine: Engine to watch (use ``AsyncEngine.sync_engine`` for async engines)
+    :param threshold_ms: Minimal duration of a logged query in milliseconds
+    :type threshold_ms: float
+    :return: None
+    """
+    event.listen(sync_engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(sync_engine, 'after_cursor_execute',
+                 lambda *args: _after_cursor_execute(*args, threshold_ms=threshold_ms))
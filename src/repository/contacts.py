@@ -1,28 +1,87 @@
+import calendar
 import datetime
+import re
 
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func, or_, literal, literal_column, case
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import Contact
+from src.confg.config import settings
+from src.database.models import Contact, User
 from src.schemas import ContactModel
+from src.services.autocomplete import autocomplete_index
+from src.services.fuzzy import TrigramIndex, digits
 
 
-async def get_contacts(current_user, db: Session):
+async def get_contacts(current_user, db: AsyncSession, limit: int | None = None, after_id: int | None = None):
     """
-    Retrieves a list of  contacts for a specific user
+    Retrieves a list of  contacts for a specific user ordered by id
 
     :param current_user: The user to retrieve contacts for
     :type current_user: User
     :param db: The database session
-    :type db: Session
+    :type db: AsyncSession
+    :param limit: Maximal number of contacts to return
+    :type limit: int | None
+    :param after_id: Return only contacts with id greater than this one (keyset cursor)
+    :type after_id: int | None
     :return: A list of contacts.
     :rtype: List[Contact]
     """
-    contacts = db.query(Contact).filter_by(user_id=current_user.id).all()
-    return contacts
+    query = select(Contact).filter_by(user_id=current_user.id).order_by(Contact.id)
+    if after_id is not None:
+        query = query.filter(Contact.id > after_id)
+    if limit is not None:
+        query = query.limit(limit)
+    contacts = await db.scalars(query)
+    return contacts.all()
 
 
-async def get_contact(current_user, contact_id, db: Session):
+SEARCH_FIELDS = ('first_name', 'last_name', 'email', 'phone')
+LIKE_SPECIAL_CHARS = re.compile(r'[\\%_]')
+# Literal arguments keep the expression identical to the one of ix_contacts_trgm_phone_digits
+PHONE_DIGITS = func.regexp_replace(Contact.phone, literal_column("'[^0-9]'"), literal_column("''"),
+                                   literal_column("'g'"))
+EXPORT_FIELDS = ('id', 'first_name', 'last_name', 'email', 'phone', 'birth_date')
+
+
+def export_row(contact) -> dict:
+    """
+    Convert contact to a flat dict with JSON and CSV friendly values
+
+    :param contact: Contact or a row with EXPORT_FIELDS columns
+    :type contact: Contact | Row
+    :return: Contact fields
+    :rtype: dict
+    """
+    row = {field: getattr(contact, field) for field in EXPORT_FIELDS}
+    if row['birth_date'] is not None:
+        row['birth_date'] = row['birth_date'].strftime('%Y-%m-%d')
+    return row
+
+
+async def stream_contacts(current_user, db: AsyncSession, batch_size: int = 1000):
+    """
+    Streams all contacts of a specific user in batches using a server-side cursor
+
+    :param current_user: The user to retrieve contacts for
+    :type current_user: User
+    :param db: The database session
+    :type db: AsyncSession
+    :param batch_size: Number of rows fetched from the cursor at once
+    :type batch_size: int
+    :return: An async iterator over lists of contact rows as dicts
+    :rtype: AsyncIterator[list[dict]]
+    """
+    # Plain rows instead of entities, so nothing accumulates in the identity map of the session
+    query = select(*(getattr(Contact, field) for field in EXPORT_FIELDS)) \
+        .where(Contact.user_id == current_user.id).order_by(Contact.id).execution_options(yield_per=batch_size)
+    result = await db.stream(query)
+    async for partition in result.partitions():
+        yield [export_row(row) for row in partition]
+
+
+async def get_contact(current_user, contact_id, db: AsyncSession):
     """
     Retrieves a contact for a specific user with specified by id parameter
 
@@ -31,48 +90,202 @@ async def get_contact(current_user, contact_id, db: Session):
     :param contact_id: ID of contact
     :type contact_id: int
     :param db: The database session
-    :type db: Session
+    :type db: AsyncSession
     :return: Wanted contact
     :rtype: Contact
     """
-    contact = db.query(Contact).filter_by(user_id=current_user.id).filter_by(id=contact_id).first()
+    contact = await db.scalar(select(Contact).filter_by(user_id=current_user.id).filter_by(id=contact_id))
     return contact
 
 
-def nearest_bdays(contacts: list) -> list:
+def mmdd(day: datetime.date) -> int:
     """
-    Form a list with contacts whose bdays are in 7 days range
+    Encode month and day of a date as month * 100 + day
+
+    :param day: Date to encode
+    :type day: datetime.date
+    :return: month * 100 + day
+    :rtype: int
+    """
+    return day.month * 100 + day.day
+
+
+def bday_window(days: int = 7, today: datetime.date | None = None) -> list[int]:
+    """
+    Form month * 100 + day values of the dates in ``days`` days range after today
+
+    Birthdays on Feb 29 are celebrated on Mar 1 in non-leap years.
+
+    :param days: Length of the range in days
+    :type days: int
+    :param today: Reference date, today by default
+    :type today: datetime.date | None
+    :return: A list of month * 100 + day values
+    :rtype: list[int]
+    """
+    today = today or datetime.date.today()
+    window = []
+    for offset in range(1, days + 1):
+        day = today + datetime.timedelta(days=offset)
+        window.append(mmdd(day))
+        if (day.month, day.day) == (3, 1) and not calendar.isleap(day.year):
+            window.append(229)
+    return window
+
+
+def nearest_bdays(contacts: list, days: int = 7, today: datetime.date | None = None) -> list:
+    """
+    Form a list with contacts whose bdays are in ``days`` days range
 
     :param contacts: A List of contacts
     :type contacts: list[Contacts]
+    :param days: Length of the range in days
+    :type days: int
+    :param today: Reference date, today by default
+    :type today: datetime.date | None
     :return: A list of contacts
     :rtype: List[Contacts]
     """
-    near_contacts = []
-    for contact in contacts:
-        next_bday = datetime.date(datetime.date.today().year, contact.birth_date.month, contact.birth_date.day)
-        if next_bday > datetime.date.today():
-            if next_bday - datetime.date.today() < datetime.timedelta(7):
-                near_contacts.append(contact)
-    return near_contacts
+    window = set(bday_window(days, today))
+    return [contact for contact in contacts
+            if mmdd(contact.birth_date) in window]
 
 
-async def get_nearest_bdays(current_user, db: Session):
+async def get_nearest_bdays(current_user, db: AsyncSession, days: int = 7):
     """
-    Retrieves a list with contacts whose bdays are in 7 days range for specified user
+    Retrieves a list with contacts whose bdays are in ``days`` days range for specified user
 
     :param current_user: The user to retrieve contacts for
     :type current_user: User
     :param db: The database session
-    :type db: Session
+    :type db: AsyncSession
+    :param days: Length of the range in days
+    :type days: int
     :return: A list of contacts
     :rtype: List[Contacts]
     """
-    contacts = nearest_bdays(db.query(Contact).filter_by(user_id=current_user.id).all())
-    return contacts
+    contacts = await db.scalars(select(Contact).filter_by(user_id=current_user.id)
+                                .filter(Contact.birth_mmdd.in_(bday_window(days))))
+    return contacts.all()
+
+
+async def get_nearest_bdays_of_all_users(db: AsyncSession, days: int = 7, after_user_id: int = 0):
+    """
+    Retrieves contacts whose bdays are in ``days`` days range for all confirmed users in one query
+
+    :param db: The database session
+    :type db: AsyncSession
+    :param days: Length of the range in days
+    :type days: int
+    :param after_user_id: Skip users with id less than or equal to this one
+    :type after_user_id: int
+    :return: Rows of user id, email and username with contact fields, ordered by user id
+    :rtype: list[Row]
+    """
+    query = select(User.id.label('user_id'), User.email.label('user_email'), User.username,
+                   Contact.first_name, Contact.last_name, Contact.birth_date) \
+        .join(User, Contact.user_id == User.id) \
+        .filter(User.confirmed.is_(True), User.id > after_user_id,
+                Contact.birth_mmdd.in_(bday_window(days))) \
+        .order_by(User.id, Contact.id)
+    rows = await db.execute(query)
+    return rows.all()
+
+
+async def search_contacts(current_user, q: str, db: AsyncSession, fields: tuple = SEARCH_FIELDS, limit: int = 20):
+    """
+    Retrieves contacts of specified user whose fields start with the query, case-insensitive
+
+    :param current_user: The user to retrieve contacts for
+    :type current_user: User
+    :param q: Prefix to search for
+    :type q: str
+    :param db: The database session
+    :type db: AsyncSession
+    :param fields: Fields to search in, subset of SEARCH_FIELDS
+    :type fields: tuple
+    :param limit: Maximal number of contacts to return
+    :type limit: int
+    :return: A list of contacts
+    :rtype: list[Contact]
+    """
+    pattern = LIKE_SPECIAL_CHARS.sub(r'\\\g<0>', q.lower()) + '%'
+    conditions = [func.lower(getattr(Contact, field)).like(pattern, escape='\\') for field in fields]
+    contacts = await db.scalars(select(Contact).filter_by(user_id=current_user.id).filter(or_(*conditions))
+                                .order_by(Contact.id).limit(limit))
+    return contacts.all()
+
+
+async def fuzzy_search_contacts(current_user, q: str, db: AsyncSession, limit: int = 20):
+    """
+    Retrieves contacts of specified user ranked by trigram similarity of names and email to the query.
+    Digits of the query are also matched as a substring of the phone number.
+
+    Uses pg_trgm on Postgres and an in-memory trigram index on other databases.
+
+    :param current_user: The user to retrieve contacts for
+    :type current_user: User
+    :param q: Text to search for, may contain typos
+    :type q: str
+    :param db: The database session
+    :type db: AsyncSession
+    :param limit: Maximal number of contacts to return
+    :type limit: int
+    :return: A list of contacts, best match first
+    :rtype: list[Contact]
+    """
+    threshold = settings.fuzzy_search_threshold
+    query_digits = digits(q)
+    if db.bind.dialect.name != 'postgresql':
+        contacts = await db.scalars(select(Contact).filter_by(user_id=current_user.id))
+        index = TrigramIndex(threshold)
+        for contact in contacts:
+            index.add(contact, [contact.first_name, contact.last_name, contact.email], contact.phone)
+        return [contact for contact, _ in index.search(q, limit)]
+
+    text_fields = (Contact.first_name, Contact.last_name, Contact.email)
+    conditions = [literal(q).op('<%')(field) for field in text_fields]
+    score = func.greatest(*[func.word_similarity(q, field) for field in text_fields])
+    if len(query_digits) >= 3:
+        phone_match = PHONE_DIGITS.like(f'%{query_digits}%')
+        conditions.append(phone_match)
+        score = func.greatest(score, case((phone_match, 1.0), else_=0.0))
+    await db.execute(select(func.set_config('pg_trgm.word_similarity_threshold', str(threshold), True)))
+    contacts = await db.scalars(select(Contact).filter_by(user_id=current_user.id).filter(or_(*conditions))
+                                .order_by(score.desc(), Contact.id).limit(limit))
+    return contacts.all()
+
+
+async def autocomplete(current_user, prefix: str, db: AsyncSession, limit: int = 10) -> list[dict]:
+    """
+    Suggests contacts of specified user with a name or email word starting with the prefix.
+    The in-memory index of the user is built from the database on first use.
+
+    :param current_user: The user to retrieve contacts for
+    :type current_user: User
+    :param prefix: Beginning of a name or email
+    :type prefix: str
+    :param db: The database session
+    :type db: AsyncSession
+    :param limit: Maximal number of suggestions
+    :type limit: int
+    :return: Suggested contacts with id, names and email
+    :rtype: list[dict]
+    """
+    index = autocomplete_index.get(current_user.id)
+    if index is None:
+        version = autocomplete_index.start_build(current_user.id)
+        try:
+            rows = await db.execute(select(Contact.id, Contact.first_name, Contact.last_name, Contact.email)
+                                    .filter_by(user_id=current_user.id))
+        except Exception:
+            autocomplete_index.cancel_build(current_user.id)
+            raise
+        index = autocomplete_index.finish_build(current_user.id, rows.all(), version)
+    return index.search(prefix, limit)
 
 
-async def get_contact_by_field(current_user, field_name: str, field_value: str, db: Session) -> list[Contact]:
+async def get_contact_by_field(current_user, field_name: str, field_value: str, db: AsyncSession) -> list[Contact]:
     """
     Retrieves list of contacts selected by specific field and it's value for specified user
 
@@ -83,18 +296,18 @@ async def get_contact_by_field(current_user, field_name: str, field_value: str,
     :param field_value: Value of wanted field
     :type field_value: str
     :param db: The database session
-    :type db: Session
+    :type db: AsyncSession
     :return: A list of contacts
     :rtype: list[Contact]
     """
-    if not hasattr(Contact, field_name):
+    if field_name not in SEARCH_FIELDS:
         raise HTTPException(status_code=404, detail="Invalid field name")
-    contacts = db.query(Contact).filter_by(user_id=current_user.id) \
-        .filter(getattr(Contact, field_name) == field_value).all()
-    return contacts
+    contacts = await db.scalars(select(Contact).filter_by(user_id=current_user.id)
+                                .filter(getattr(Contact, field_name) == field_value))
+    return contacts.all()
 
 
-async def create(current_user, body: ContactModel, db: Session):
+async def create(current_user, body: ContactModel, db: AsyncSession):
     """
     Create new contact for specified user
 
@@ -103,21 +316,23 @@ async def create(current_user, body: ContactModel, db: Session):
     :param body: The data for the new contact to create
     :type body: ContactModel
     :param db: The database session
-    :type db: Session
+    :type db: AsyncSession
     :return: Just created contact
     :rtype: Contact
     """
     contact = Contact(**body.dict())
     contact.user_id = current_user.id
+    contact.birth_mmdd = mmdd(body.birth_date)
     if contact:
         db.add(contact)
-        db.commit()
-        db.refresh(contact)
-        db.commit()
+        await db.commit()
+        await db.refresh(contact)
+        autocomplete_index.upsert(current_user.id, contact)
+        await autocomplete_index.broadcast(current_user.id)
     return contact
 
 
-async def update(current_user, contact_id: int, body: ContactModel, db: Session):
+async def update(current_user, contact_id: int, body: ContactModel, db: AsyncSession):
     """
     Update contact for specified user
 
@@ -128,7 +343,7 @@ async def update(current_user, contact_id: int, body: ContactModel, db: Session)
     :param body: The data for the new contact to create
     :type body: ContactModel
     :param db: The database session
-    :type db: Session
+    :type db: AsyncSession
     :return: Just updated contact
     :rtype: Contact
     """
@@ -140,12 +355,15 @@ async def update(current_user, contact_id: int, body: ContactModel, db: Session)
         contact.email = body.email
         contact.phone = body.phone
         contact.birth_date = body.birth_date
-        db.commit()
-        db.refresh(contact)
+        contact.birth_mmdd = mmdd(body.birth_date)
+        await db.commit()
+        await db.refresh(contact)
+        autocomplete_index.upsert(current_user.id, contact)
+        await autocomplete_index.broadcast(current_user.id)
     return contact
 
 
-async def remove(current_user, contact_id, db: Session):
+async def remove(current_user, contact_id, db: AsyncSession):
     """
     Create new contact for specified user
 
@@ -154,12 +372,14 @@ async def remove(current_user, contact_id, db: Session):
     :param contact_id: Contact to update
     :type contact_id: int
     :param db: The database session
-    :type db: Session
+    :type db: AsyncSession
     :return: Just deleted contact
     :rtype: Contact
     """
     contact = await get_contact(current_user, contact_id, db)
     if contact:
-        db.delete(contact)
-        db.commit()
+        await db.delete(contact)
+        await db.commit()
+        autocomplete_index.discard(current_user.id, contact.id)
+        await autocomplete_index.broadcast(current_user.id)
     return contact
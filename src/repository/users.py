@@ -1,24 +1,46 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User
 from src.schemas import UserModel
+from src.services.principal import Principal
+from src.services.principal_cache import principal_cache
 
+# Dialects supporting INSERT ... ON CONFLICT DO NOTHING RETURNING
+UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
 
-async def get_user_by_email(email: str, db: Session) -> User | None:
+
+async def get_user_by_email(email: str, db: AsyncSession) -> User | None:
     """
-    Retrieves user specified by email
+    Retrieves user specified by email, case-insensitive
 
     :param email: email to search user by
     :type email: str
     :param db: The database session
-    :type db: Session
+    :type db: AsyncSession
+    :return: Founded user
+    :rtype: User
+    """
+    return await db.scalar(select(User).filter(func.lower(User.email) == email.lower()))
+
+
+async def get_user_by_id(user_id: int, db: AsyncSession) -> User | None:
+    """
+    Retrieves user by primary key, served from the session identity map when already loaded
+
+    :param user_id: ID of the user
+    :type user_id: int
+    :param db: The database session
+    :type db: AsyncSession
     :return: Founded user
     :rtype: User
     """
-    return db.query(User).filter(User.email == email).first()
+    return await db.get(User, user_id)
 
 
-async def update_avatar(email, url: str, db: Session) -> User:
+async def update_avatar(email, url: str, db: AsyncSession) -> User:
     """
     Update avatar of specified user
 
@@ -27,35 +49,46 @@ async def update_avatar(email, url: str, db: Session) -> User:
     :param url: URL for picture
     :type url: str
     :param db: The database session
-    :type db: Session
+    :type db: AsyncSession
     :return: user
     :rtype: User
     """
     user = await get_user_by_email(email, db)
     user.avatar = url
-    db.commit()
+    await db.commit()
+    await principal_cache.refresh(Principal.from_user(user))
     return user
 
 
-async def create_user(body: UserModel, db: Session):
+async def create_user(body: UserModel, db: AsyncSession) -> User | None:
     """
-    Create new user
+    Create new user with a single INSERT ... ON CONFLICT DO NOTHING RETURNING statement,
+    so concurrent signups with the same email or username can not both pass a check
 
     :param body: The data fot the new user to create
     :type body UserModel
     :param db: The database session
-    :type db: Session
-    :return: Just created user
-    :rtype: User
+    :type db: AsyncSession
+    :return: Just created user, None if the email or username is already taken
+    :rtype: User | None
     """
-    new_user = User(**body.dict())
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    insert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if insert is None:
+        new_user = User(**body.dict())
+        db.add(new_user)
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            return None
+        return new_user
+
+    new_user = await db.scalar(insert(User).values(**body.dict()).on_conflict_do_nothing().returning(User))
+    await db.commit()
     return new_user
 
 
-async def update_token(user: User, refresh_token, db: Session):
+async def update_token(user: User, refresh_token, db: AsyncSession):
     """
     Update access token
 
@@ -64,24 +97,41 @@ async def update_token(user: User, refresh_token, db: Session):
     :param refresh_token: User's refresh token
     :type refresh_token: str
     :param db: The database session
-    :type db: Session
+    :type db: AsyncSession
     :return: None
     """
 
     user.refresh_token = refresh_token
-    db.commit()
+    await db.commit()
+
+
+async def update_password(user: User, password_hash: str, db: AsyncSession) -> None:
+    """
+    Replace password hash of the user, e.g. after rehashing with current parameters
+
+    :param user: User whose password hash is replaced
+    :type user: User
+    :param password_hash: New password hash
+    :type password_hash: str
+    :param db: The database session
+    :type db: AsyncSession
+    :return: None
+    """
+    user.password = password_hash
+    await db.commit()
 
 
-async def confirmed_email(email: str, db: Session) -> None:
+async def confirmed_email(email: str, db: AsyncSession) -> None:
     """
     Mark account as confirmed in database
 
     :param email: email of user which is confirming it
     :type email: str
     :param db: The database session
-    :type db: Session
+    :type db: AsyncSession
     :return: None
     """
     user = await get_user_by_email(email, db)
     user.confirmed = True
-    db.commit()
+    await db.commit()
+    await principal_cache.refresh(Principal.from_user(user))
@@ -1,63 +1,199 @@
+import base64
+import csv
+import io
+import json
 from typing import List
 
-from fastapi import Depends, HTTPException, status, Path, APIRouter
+from fastapi import Depends, HTTPException, status, Path, APIRouter, Query
+from fastapi.responses import StreamingResponse
 from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
-from src.database.db import get_db
-from src.database.models import User
-from src.schemas import ContactResponse, ContactModel
+from src.database.db import get_async_db
+from src.confg.config import settings
+from src.schemas import ContactResponse, ContactModel, ContactPage, ContactSuggestion
 from src.repository import contacts as repos_contacts
 from src.services.auth import auth_service
+from src.services.principal import Principal
 
 router = APIRouter(prefix='/contacts', tags=['contacts'])
 
 
-@router.get('/all', response_model=List[ContactResponse], description='No more than 10 requests per minute',
+def encode_cursor(contact_id: int) -> str:
+    """
+    Build an opaque pagination cursor pointing after the given contact
+
+    :param contact_id: ID of the last contact on the page
+    :type contact_id: int
+    :return: cursor
+    :rtype: str
+    """
+    return base64.urlsafe_b64encode(str(contact_id).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Read contact id from an opaque pagination cursor
+
+    :param cursor: cursor returned as ``next_cursor``
+    :type cursor: str
+    :return: ID of the last contact of the previous page
+    :rtype: int
+    """
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor')
+
+
+@router.get('/all', response_model=ContactPage, description='No more than 10 requests per minute',
             dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def get_contacts(db: Session = Depends(get_db),
-                       current_user: User = Depends(auth_service.get_current_user)):
+async def get_contacts(limit: int = Query(50, ge=1, le=500), cursor: str | None = Query(None),
+                       db: AsyncSession = Depends(get_async_db),
+                       current_user: Principal = Depends(auth_service.get_token_principal)):
     """
-    Retrieves a list of  contacts for a specific user
+    Retrieves a page of contacts for a specific user
 
+    :param limit: Maximal number of contacts on the page
+    :type limit: int
+    :param cursor: ``next_cursor`` of the previous page
+    :type cursor: str | None
     :param current_user: The user to retrieve contacts for
     :type current_user: User
     :param db: The database session
-    :type db: Session
-    :return: A list of contacts.
-    :rtype: List[Contact]
+    :type db: AsyncSession
+    :return: A page of contacts and the cursor of the next page
+    :rtype: dict
     """
-    contacts = await repos_contacts.get_contacts(current_user, db)
-    if contacts is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Not Found')
-    return contacts
+    after_id = decode_cursor(cursor) if cursor else None
+    contacts = await repos_contacts.get_contacts(current_user, db, limit=limit + 1, after_id=after_id)
+    next_cursor = encode_cursor(contacts[limit - 1].id) if len(contacts) > limit else None
+    return {"items": contacts[:limit], "next_cursor": next_cursor}
 
 
 @router.get('/bday', response_model=List[ContactResponse], description='No more than 10 requests per minute',
             dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def get_nearest_bdays(db: Session = Depends(get_db),
-                            current_user: User = Depends(auth_service.get_current_user)):
+async def get_nearest_bdays(days: int = Query(7, ge=1, le=366), db: AsyncSession = Depends(get_async_db),
+                            current_user: Principal = Depends(auth_service.get_token_principal)):
     """
-        Retrieves a list with contacts whose bdays are in 7 days range for specified user
+        Retrieves a list with contacts whose bdays are in ``days`` days range for specified user
 
+        :param days: Length of the range in days
+        :type days: int
         :param current_user: The user to retrieve contacts for
         :type current_user: User
         :param db: The database session
-        :type db: Session
+        :type db: AsyncSession
         :return: A list of contacts
         :rtype: List[Contacts]
         """
-    contacts = await repos_contacts.get_nearest_bdays(current_user, db)
+    contacts = await repos_contacts.get_nearest_bdays(current_user, db, days)
     if contacts is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Not Found')
     return contacts
 
 
+@router.get('/search', response_model=List[ContactResponse], description='No more than 10 requests per minute',
+            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
+async def search_contacts(q: str = Query(min_length=1, max_length=100),
+                          field: str | None = Query(None, regex=f"^({'|'.join(repos_contacts.SEARCH_FIELDS)})$"),
+                          limit: int = Query(20, ge=1, le=100), fuzzy: bool = Query(False),
+                          db: AsyncSession = Depends(get_async_db),
+                          current_user: Principal = Depends(auth_service.get_token_principal)):
+    """
+    Retrieves contacts whose first name, last name, email or phone start with the query, case-insensitive.
+    In fuzzy mode contacts are ranked by similarity to the query, so typos and partial phone numbers match.
+
+    :param q: Prefix to search for
+    :type q: str
+    :param field: Search only in this field, ignored in fuzzy mode
+    :type field: str | None
+    :param limit: Maximal number of contacts to return
+    :type limit: int
+    :param fuzzy: Rank by trigram similarity instead of prefix matching
+    :type fuzzy: bool
+    :param current_user: The user to retrieve contacts for
+    :type current_user: User
+    :param db: The database session
+    :type db: AsyncSession
+    :return: A list of contacts
+    :rtype: list[Contact]
+    """
+    if fuzzy:
+        return await repos_contacts.fuzzy_search_contacts(current_user, q, db, limit)
+    fields = (field,) if field else repos_contacts.SEARCH_FIELDS
+    return await repos_contacts.search_contacts(current_user, q, db, fields, limit)
+
+
+@router.get('/autocomplete', response_model=List[ContactSuggestion])
+async def autocomplete(prefix: str = Query(min_length=1, max_length=100), limit: int = Query(10, ge=1, le=50),
+                       db: AsyncSession = Depends(get_async_db),
+                       current_user: Principal = Depends(auth_service.get_token_principal)):
+    """
+    Suggests contacts whose name or email word starts with the prefix, for type-ahead
+
+    :param prefix: Beginning of a name or email
+    :type prefix: str
+    :param limit: Maximal number of suggestions
+    :type limit: int
+    :param current_user: The user to retrieve contacts for
+    :type current_user: User
+    :param db: The database session
+    :type db: AsyncSession
+    :return: A list of suggested contacts
+    :rtype: list[dict]
+    """
+    if settings.autocomplete_enabled:
+        return await repos_contacts.autocomplete(current_user, prefix, db, limit)
+    return await repos_contacts.search_contacts(current_user, prefix, db, ('first_name', 'last_name', 'email'), limit)
+
+
+@router.get('/export', description='No more than 10 requests per minute',
+            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
+async def export_contacts(export_format: str = Query('ndjson', alias='format', regex='^(ndjson|csv)$'),
+                          db: AsyncSession = Depends(get_async_db),
+                          current_user: Principal = Depends(auth_service.get_token_principal)):
+    """
+    Streams the full contact list of a specific user as NDJSON or CSV
+
+    :param export_format: Output format, ``ndjson`` or ``csv``
+    :type export_format: str
+    :param current_user: The user to export contacts for
+    :type current_user: User
+    :param db: The database session
+    :type db: AsyncSession
+    :return: Streaming response with contacts
+    :rtype: StreamingResponse
+    """
+    batches = repos_contacts.stream_contacts(current_user, db)
+    if export_format == 'csv':
+        return StreamingResponse(csv_chunks(batches), media_type='text/csv',
+                                 headers={'Content-Disposition': 'attachment; filename="contacts.csv"'})
+    return StreamingResponse(ndjson_chunks(batches), media_type='application/x-ndjson')
+
+
+async def ndjson_chunks(batches):
+    async for rows in batches:
+        yield ''.join(json.dumps(row) + '\n' for row in rows)
+
+
+async def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=repos_contacts.EXPORT_FIELDS)
+    writer.writeheader()
+    yield buffer.getvalue()
+    async for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
 @router.get('/{contact_id}', response_model=ContactResponse, description='No more than 10 requests per minute',
             dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def get_contact(contact_id: int = Path(ge=1), db: Session = Depends(get_db),
-                      current_user: User = Depends(auth_service.get_current_user)):
+async def get_contact(contact_id: int = Path(ge=1), db: AsyncSession = Depends(get_async_db),
+                      current_user: Principal = Depends(auth_service.get_token_principal)):
     """
         Retrieves a contact for a specific user with specified by id parameter
 
@@ -66,7 +202,7 @@ async def get_contact(contact_id: int = Path(ge=1), db: Session = Depends(get_db
         :param contact_id: ID of contact
         :type contact_id: int
         :param db: The database session
-        :type db: Session
+        :type db: AsyncSession
         :return: Wanted contact
         :rtype: Contact
         """
@@ -79,8 +215,8 @@ async def get_contact(contact_id: int = Path(ge=1), db: Session = Depends(get_db
 @router.get('/{field_name}/{field_value}', response_model=List[ContactResponse],
             description='No more than 10 requests per minute',
             dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def get_contacts_by_field(field_name: str, field_value: str, db: Session = Depends(get_db),
-                                current_user: User = Depends(auth_service.get_current_user)):
+async def get_contacts_by_field(field_name: str, field_value: str, db: AsyncSession = Depends(get_async_db),
+                                current_user: Principal = Depends(auth_service.get_token_principal)):
     """
         Retrieves list of contacts selected by specific field and it's value for specified user
 
@@ -91,7 +227,7 @@ async def get_contacts_by_field(field_name: str, field_value: str, db: Session =
         :param field_value: Value of wanted field
         :type field_value: str
         :param db: The database session
-        :type db: Session
+        :type db: AsyncSession
         :return: A list of contacts
         :rtype: list[Contact]
         """
@@ -105,8 +241,8 @@ async def get_contacts_by_field(field_name: str, field_value: str, db: Session =
 @router.post('/', response_model=ContactResponse, status_code=status.HTTP_201_CREATED,
              description='No more than 10 requests per minute',
              dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def create_contact(body: ContactModel, db: Session = Depends(get_db),
-                         current_user: User = Depends(auth_service.get_current_user)):
+async def create_contact(body: ContactModel, db: AsyncSession = Depends(get_async_db),
+                         current_user: Principal = Depends(auth_service.get_token_principal)):
     """
     Create new contact for specified user
 
@@ -115,7 +251,7 @@ async def create_contact(body: ContactModel, db: Session = Depends(get_db),
     :param body: The data for the new contact to create
     :type body: ContactModel
     :param db: The database session
-    :type db: Session
+    :type db: AsyncSession
     :return: Just created contact
     :rtype: Contact
     """
@@ -129,8 +265,8 @@ async def create_contact(body: ContactModel, db: Session = Depends(get_db),
             dependencies=[Depends(RateLimiter(times=10, seconds=60))])
 async def update_contact(body: ContactModel,
                          contact_id: int = Path(ge=1),
-                         db: Session = Depends(get_db),
-                         current_user: User = Depends(auth_service.get_current_user)):
+                         db: AsyncSession = Depends(get_async_db),
+                         current_user: Principal = Depends(auth_service.get_token_principal)):
     """
     Update contact for specified user
 
@@ -141,7 +277,7 @@ async def update_contact(body: ContactModel,
     :param body: The data for the new contact to create
     :type body: ContactModel
     :param db: The database session
-    :type db: Session
+    :type db: AsyncSession
     :return: Just updated contact
     :rtype: Contact
     """
@@ -154,8 +290,8 @@ async def update_contact(body: ContactModel,
 @router.delete('/{contact_id}', status_code=status.HTTP_204_NO_CONTENT,
                description='No more than 10 requests per minute',
                dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def remove(contact_id, db: Session = Depends(get_db),
-                 current_user: User = Depends(auth_service.get_current_user)):
+async def remove(contact_id: int = Path(ge=1), db: AsyncSession = Depends(get_async_db),
+                 current_user: Principal = Depends(auth_service.get_token_principal)):
     """
         Create new contact for specified user
 
@@ -164,7 +300,7 @@ async def remove(contact_id, db: Session = Depends(get_db),
         :param contact_id: Contact to update
         :type contact_id: int
         :param db: The database session
-        :type db: Session
+        :type db: AsyncSession
         :return: Just deleted contact
         :rtype: Contact
         """
@@ -1,25 +1,25 @@
-from typing import List
-
 from fastapi import APIRouter, HTTPException, Depends, status, Security, BackgroundTasks, Request, UploadFile, File
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import cloudinary
 import cloudinary.uploader
 
 from src.confg.config import settings
-from src.database.db import get_db
-from src.database.models import User
+from src.database.db import get_async_db
 from src.schemas import UserModel, UserResponse, TokenModel, RequestEmail, UserDb
 from src.repository import users as repository_users
 from src.services.auth import auth_service
+from src.services.principal import Principal
 from src.services.email import send_email
+from src.services.refresh_tokens import refresh_token_store
 auth_router = APIRouter(prefix="/auth", tags=['auth'])
 
 security = HTTPBearer()
 
 
 @auth_router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
+async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request,
+                 db: AsyncSession = Depends(get_async_db)):
     """
         Create new user and send email confirmation
 
@@ -30,28 +30,27 @@ async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Re
         :param body: The data fot the new user to create
         :type body UserModel
         :param db: The database session
-        :type db: Session
+        :type db: AsyncSession
         :return: Just created user
         :rtype: User
         """
-    exist_user = await repository_users.get_user_by_email(body.email, db)
-    if exist_user:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
     new_user = await repository_users.create_user(body, db)
+    if new_user is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
     background_tasks.add_task(send_email, new_user.email, new_user.username, request.base_url)
     return {"user": new_user, "detail": "User successfully created"}
 
 
 @auth_router.post("/login", response_model=TokenModel)
-async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     """
     Create and update access and refresh tokens, check credentials and authenticate user
 
     :param body: Credentials data
     :type body: OAuth2PasswordRequestForm
     :param db: Database session
-    :type db: Session
+    :type db: AsyncSession
     :return: access and refresh tokens with token type
     :rtype: dict
     """
@@ -61,49 +60,98 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
     if not user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
-    if not auth_service.verify_password(body.password, user.password):
+    valid, new_hash = await auth_service.verify_and_update_password(body.password, user.password)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
+    if new_hash:
+        await repository_users.update_password(user, new_hash, db)
     # Generate JWT
-    access_token = await auth_service.create_access_token(data={"sub": user.email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
-    await repository_users.update_token(user, refresh_token, db)
+    claims = {"sub": str(user.id), **auth_service.principal_claims(user)}
+    if settings.refresh_tokens_in_redis:
+        family = await refresh_token_store.start()
+        # The access token carries the family too, so logout can revoke it
+        access_token = await auth_service.create_access_token(data={**claims, 'fam': family['fam']})
+        refresh_token = await auth_service.create_refresh_token(data={**claims, **family})
+    else:
+        access_token = await auth_service.create_access_token(data=claims)
+        refresh_token = await auth_service.create_refresh_token(data=claims)
+        await repository_users.update_token(user, refresh_token, db)
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
 @auth_router.get('/refresh_token', response_model=TokenModel)
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: Session = Depends(get_db)):
+async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security),
+                        db: AsyncSession = Depends(get_async_db)):
     """
         Update access and refresh tokens
 
         :param credentials: User credentials
         :type credentials: HTTPAuthorizationCredentials
         :param db: The database session
-        :type db: Session
+        :type db: AsyncSession
         :return: :return: access and refresh tokens with token type
         :rtype: dict
         """
     token = credentials.credentials
-    email = await auth_service.decode_refresh_token(token)
-    user = await repository_users.get_user_by_email(email, db)
+    if settings.refresh_tokens_in_redis:
+        payload = await auth_service.decode_refresh_token_payload(token)
+        # Read-only lookup, so the embedded principal follows changes of the user
+        principal = await auth_service.get_principal(payload['sub'], db)
+        if principal is None:
+            if 'fam' in payload:
+                await refresh_token_store.revoke(payload['fam'])
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+        family = await refresh_token_store.rotate(payload.get('fam'), payload.get('gen'))
+        claims = {"sub": str(principal.id), **auth_service.principal_claims(principal), 'fam': family['fam']}
+        access_token = await auth_service.create_access_token(data=claims)
+        refresh_token = await auth_service.create_refresh_token(data={**claims, **family})
+        return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+    subject = await auth_service.decode_refresh_token(token)
+    user = await auth_service.get_user_by_subject(subject, db)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
     if user.refresh_token != token:
         await repository_users.update_token(user, None, db)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
 
-    access_token = await auth_service.create_access_token(data={"sub": email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": email})
+    claims = {"sub": str(user.id), **auth_service.principal_claims(user)}
+    access_token = await auth_service.create_access_token(data=claims)
+    refresh_token = await auth_service.create_refresh_token(data=claims)
     await repository_users.update_token(user, refresh_token, db)
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
+@auth_router.post('/logout', status_code=status.HTTP_204_NO_CONTENT)
+async def logout(credentials: HTTPAuthorizationCredentials = Security(security),
+                 db: AsyncSession = Depends(get_async_db)):
+    """
+    Revoke the presented access token and the refresh token of the user
+
+    :param credentials: User credentials
+    :type credentials: HTTPAuthorizationCredentials
+    :param db: The database session
+    :type db: AsyncSession
+    :return: None
+    """
+    payload = await auth_service.revoke_access_token(credentials.credentials)
+    if 'fam' in payload:
+        await refresh_token_store.revoke(payload['fam'])
+        return
+    user = await auth_service.get_user_by_subject(payload['sub'], db)
+    if user is not None:
+        await repository_users.update_token(user, None, db)
+
+
 @auth_router.get('/confirmed_email/{token}')
-async def confirmed_email(token: str, db: Session = Depends(get_db)):
+async def confirmed_email(token: str, db: AsyncSession = Depends(get_async_db)):
     """
     Mark account as confirmed in database
 
     :param token:  access token
     :type token: str
     :param db: The database session
-    :type db: Session
+    :type db: AsyncSession
     :return: message with the status of confirmation operation
     :rtype: dict
     """
@@ -119,7 +167,7 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
 
 @auth_router.post('/request_email')
 async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
-                        db: Session = Depends(get_db)):
+                        db: AsyncSession = Depends(get_async_db)):
     """
     Reconfirmation of email address
 
@@ -130,7 +178,7 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     :param request: Http request
     :type request: Request
     :param db: The database session
-    :type db: Session
+    :type db: AsyncSession
     :return: email confirmation status message
     :rtype: dict
     """
@@ -143,8 +191,8 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
 
 
 @auth_router.patch('/avatar', response_model=UserDb)
-async def update_avatar_user(file: UploadFile = File(), current_user: User = Depends(auth_service.get_current_user),
-                             db: Session = Depends(get_db)):
+async def update_avatar_user(file: UploadFile = File(), current_user: Principal = Depends(auth_service.get_current_user),
+                             db: AsyncSession = Depends(get_async_db)):
     """
         Update avatar of specified user
 
@@ -153,7 +201,7 @@ async def update_avatar_user(file: UploadFile = File(), current_user: User = Dep
         :param file: Image which is updating
         :type file: UploadFile
         :param db: The database session
-        :type db: Session
+        :type db: AsyncSession
         :return: user
         :rtype: User
         """
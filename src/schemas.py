@@ -1,3 +1,5 @@
+from typing import List, Optional
+
 from pydantic import BaseModel, Field, EmailStr, validator
 from pydantic.types import date
 
@@ -45,12 +47,27 @@ class ContactResponse(BaseModel):
     email: EmailStr
     phone: str
     birth_date: date
-    user: UserResponse
+    user: UserDb
+
+    class Config:
+        orm_mode = True
+
+
+class ContactSuggestion(BaseModel):
+    id: int
+    first_name: Optional[str]
+    last_name: Optional[str]
+    email: Optional[str]
 
     class Config:
         orm_mode = True
 
 
+class ContactPage(BaseModel):
+    items: List[ContactResponse]
+    next_cursor: Optional[str] = None
+
+
 class TokenModel(BaseModel):
     access_token: str
     refresh_token: str
@@ -1,45 +1,46 @@
+import uuid
 from datetime import datetime, timedelta
 from typing import Optional
-import pickle
-import redis
 
 from fastapi import Depends, HTTPException, status
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+from jose import JWTError
 
 from src.confg.config import settings
-from src.database.db import get_db
+from src.database.db import get_async_db
 from src.repository import users as repository_users
+from src.services.jwt_keys import key_ring
+from src.services.passwords import password_hasher
+from src.services.principal import Principal
+from src.services.principal_cache import principal_cache
+from src.services.revocation import revocation_list
+from src.services.token_cache import token_cache
 
 
 class Auth:
     """
     Class that define the entire authorization process
     """
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    SECRET_KEY = settings.secret_key
-    ALGORITHM = settings.algorithm
+    key_ring = key_ring
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
 
-    def verify_password(self, plain_password, hashed_password):
+    async def verify_and_update_password(self, plain_password, hashed_password):
         """
-        Verifies password
+        Verifies password and gives a new hash when the stored one uses outdated scheme or cost
 
-        :return: Is the password correct
-        :rtype: bool
+        :return: Is the password correct and the new hash or None
+        :rtype: tuple[bool, str | None]
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return await password_hasher.verify_and_update(plain_password, hashed_password)
 
-    def get_password_hash(self, password: str):
+    async def get_password_hash(self, password: str):
         """
-        Hash the password
+        Hash the password in the password hashing executor
 
         :rtype: str
         """
-        return self.pwd_context.hash(password)
+        return await password_hasher.hash(password)
 
     # define a function to generate a new access token
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
@@ -56,8 +57,8 @@ class Auth:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
             expire = datetime.utcnow() + timedelta(minutes=15)
-        to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "access_token"})
-        encoded_access_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "access_token", "jti": uuid.uuid4().hex})
+        encoded_access_token = self.key_ring.sign(to_encode)
         return encoded_access_token
 
     # define a function to generate a new refresh token
@@ -74,9 +75,9 @@ class Auth:
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(days=7)
+            expire = datetime.utcnow() + timedelta(seconds=settings.refresh_token_ttl)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"})
-        encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        encoded_refresh_token = self.key_ring.sign(to_encode)
         return encoded_refresh_token
 
     async def decode_refresh_token(self, refresh_token: str):
@@ -84,26 +85,54 @@ class Auth:
         Decode refresh token
 
         :type refresh_token: str
-        :return: refresh token email data
+        :return: subject of the refresh token
         :rtype: str
         """
+        payload = await self.decode_refresh_token_payload(refresh_token)
+        return payload['sub']
+
+    async def decode_refresh_token_payload(self, refresh_token: str):
+        """
+        Decode refresh token with all its claims
+
+        :type refresh_token: str
+        :return: claims of the refresh token
+        :rtype: dict
+        """
         try:
-            payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.key_ring.verify(refresh_token)
+            if 'uid' in payload and payload.get('ver') != settings.principal_token_version:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Login required')
             if payload['scope'] == 'refresh_token':
-                email = payload['sub']
-                return email
+                return payload
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    def decode_access_token(self, token: str) -> dict:
         """
-        Get authorized user by token
+        Verify access token, reusing claims of tokens verified before
 
         :type token: str
-        :type db: Session
-        :return: current user
-        :rtype: User
+        :return: claims of the token
+        :rtype: dict
+        :raises JWTError: the token is invalid or expired
+        """
+        payload = token_cache.get(token)
+        if payload is None:
+            payload = self.key_ring.verify(token)
+            if payload.get('scope') == 'access_token':
+                token_cache.put(token, payload)
+        return payload
+
+    async def verify_access_token(self, token: str) -> dict:
+        """
+        Verify access token and check it was not revoked
+
+        :type token: str
+        :return: claims of the token
+        :rtype: dict
+        :raises HTTPException: 401 if the token is invalid, expired, revoked or not an access token
         """
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -113,37 +142,137 @@ class Auth:
 
         try:
             # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'access_token':
-                email = payload["sub"]
-                if email is None:
-                    raise credentials_exception
-            else:
+            payload = self.decode_access_token(token)
+            if payload['scope'] != 'access_token' or payload.get('sub') is None:
                 raise credentials_exception
         except JWTError as e:
             raise credentials_exception
+        if 'jti' in payload and await revocation_list.is_revoked(payload['jti']):
+            raise credentials_exception
+        if 'uid' in payload and payload.get('ver') != settings.principal_token_version:
+            # Embedded principal was issued before a forced re-login
+            raise credentials_exception
+        return payload
+
+    async def get_user_by_subject(self, subject: str, db: AsyncSession):
+        """
+        Load user by token subject: the user id, or the email in tokens issued before id subjects
+
+        :type subject: str
+        :type db: AsyncSession
+        :return: user or None
+        :rtype: User | None
+        """
+        if subject.isdigit():
+            return await repository_users.get_user_by_id(int(subject), db)
+        return await repository_users.get_user_by_email(subject, db)
+
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+        """
+        Get authorized user by token
+
+        :type token: str
+        :type db: AsyncSession
+        :return: current user
+        :rtype: Principal
+        """
+        payload = await self.verify_access_token(token)
+        return await self.get_payload_principal(payload, db)
+
+    async def get_payload_principal(self, payload: dict, db: AsyncSession) -> Principal:
+        """
+        Get principal of the user a verified access token was issued to
 
-        user = self.r.get(f"user:{email}")
-        if user is None:
-            user = await repository_users.get_user_by_email(email, db)
+        :param payload: Claims of the verified access token
+        :type payload: dict
+        :type db: AsyncSession
+        :return: current user
+        :rtype: Principal
+        """
+        principal = await self.get_principal(payload["sub"], db)
+        if principal is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return principal
+
+    async def get_principal(self, subject: str, db: AsyncSession) -> Principal | None:
+        """
+        Get principal by token subject from the principal cache, reading the database on a miss
+
+        :type subject: str
+        :type db: AsyncSession
+        :return: principal or None if the user does not exist
+        :rtype: Principal | None
+        """
+        principal = await principal_cache.get(int(subject)) if subject.isdigit() else None
+        if principal is None:
+            user = await self.get_user_by_subject(subject, db)
             if user is None:
-                raise credentials_exception
-            self.r.set(f"user:{email}", pickle.dumps(user))
-            self.r.expire(f"user:{email}", 900)
-        else:
-            user = pickle.loads(user)
-        return user
+                return None
+            principal = Principal.from_user(user)
+            await principal_cache.fill(principal)
+        return principal
+
+    async def get_token_principal(self, token: str = Depends(oauth2_scheme),
+                                  db: AsyncSession = Depends(get_async_db)):
+        """
+        Get authorized user from the principal embedded in the access token without any I/O,
+        falling back to the principal cache and the database for tokens without it. The avatar is not embedded,
+        so it is None for such principals.
+
+        :type token: str
+        :type db: AsyncSession
+        :return: current user
+        :rtype: Principal
+        """
+        payload = await self.verify_access_token(token)
+        if 'uid' not in payload:
+            return await self.get_payload_principal(payload, db)
+        return Principal(payload['uid'], payload['email'], payload['username'], payload['confirmed'], None)
+
+    def principal_claims(self, user) -> dict:
+        """
+        Claims embedding the principal into tokens, empty unless stateless principal mode is on
+
+        :param user: Authenticated user
+        :return: claims to add to the token
+        :rtype: dict
+        """
+        if not settings.stateless_principal:
+            return {}
+        return {'uid': user.id, 'email': user.email, 'username': user.username, 'confirmed': bool(user.confirmed),
+                'ver': settings.principal_token_version}
+
+    async def revoke_access_token(self, token: str) -> dict:
+        """
+        Revoke access token before it expires
+
+        :type token: str
+        :return: claims of the revoked token
+        :rtype: dict
+        """
+        try:
+            payload = self.decode_access_token(token)
+        except JWTError:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
+        if payload.get('scope') != 'access_token' or 'jti' not in payload:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
+        await revocation_list.revoke(payload['jti'], payload['exp'])
+        return payload
 
     def create_email_token(self, data: dict):
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(days=7)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire})
-        token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        token = self.key_ring.sign(to_encode)
         return token
 
     async def get_email_from_token(self, token: str):
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.key_ring.verify(token)
             email = payload["sub"]
             return email
         except JWTError as e:
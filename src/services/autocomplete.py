@@ -0,0 +1,227 @@
+import logging
+import time
+import uuid
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from redis.exceptions import RedisError
+
+from src.confg.config import settings
+from src.services.cache import get_redis, listen_channel
+from src.services.fuzzy import WORD
+
+logger = logging.getLogger(__name__)
+
+CHANGES_CHANNEL = 'contacts:changed'
+# Identifies this process in change messages, so it skips its own, already applied changes
+WORKER_ID = uuid.uuid4().hex
+
+
+def tokens(first_name: str | None, last_name: str | None, email: str | None) -> set[str]:
+    """
+    Normalized tokens a contact can be found by: lowercased words of the names and the email,
+    plus the whole email
+
+    :rtype: set[str]
+    """
+    result = set()
+    for text in (first_name, last_name, email):
+        result.update(WORD.findall((text or '').lower()))
+    if email:
+        result.add(email.lower())
+    return result
+
+
+class UserPrefixIndex:
+    """
+    Sorted array of (token, contact id) pairs of one user, searched by binary search
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.contacts = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self, rows) -> None:
+        """
+        Fill an empty index from (id, first_name, last_name, email) rows with a single sort
+        """
+        for contact_id, first_name, last_name, email in rows:
+            self.entries.extend((token, contact_id) for token in tokens(first_name, last_name, email))
+            self.contacts[contact_id] = {'id': contact_id, 'first_name': first_name, 'last_name': last_name,
+                                         'email': email}
+        self.entries.sort()
+
+    def upsert(self, contact_id: int, first_name: str | None, last_name: str | None, email: str | None) -> None:
+        self.discard(contact_id)
+        for token in tokens(first_name, last_name, email):
+            insort(self.entries, (token, contact_id))
+        self.contacts[contact_id] = {'id': contact_id, 'first_name': first_name, 'last_name': last_name,
+                                     'email': email}
+
+    def discard(self, contact_id: int) -> None:
+        contact = self.contacts.pop(contact_id, None)
+        if contact is None:
+            return
+        for token in tokens(contact['first_name'], contact['last_name'], contact['email']):
+            position = bisect_left(self.entries, (token, contact_id))
+            if position < len(self.entries) and self.entries[position] == (token, contact_id):
+                del self.entries[position]
+
+    def search(self, prefix: str, limit: int) -> list[dict]:
+        prefix = prefix.lower()
+        found = []
+        position = bisect_left(self.entries, (prefix,))
+        while position < len(self.entries) and len(found) < limit:
+            token, contact_id = self.entries[position]
+            if not token.startswith(prefix):
+                break
+            if contact_id not in found:
+                found.append(contact_id)
+            position += 1
+        return [self.contacts[contact_id] for contact_id in found]
+
+
+class AutocompleteIndex:
+    """
+    Per-user prefix indexes of contacts, built lazily and evicted in LRU order when the total
+    number of entries exceeds the limit or after the TTL. Changes made by other workers arrive
+    over Redis pub/sub and drop the index of the user.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.size = 0
+        self.users = OrderedDict()
+        self.expires = {}
+        # Change counters of users whose index is being built and the number of such builds
+        self.changes = {}
+        self.pending = {}
+
+    def get(self, user_id: int) -> UserPrefixIndex | None:
+        index = self.users.get(user_id)
+        if index is not None:
+            if self.expires[user_id] <= time.monotonic():
+                self.drop(user_id)
+                return None
+            self.users.move_to_end(user_id)
+        return index
+
+    def start_build(self, user_id: int) -> int:
+        """
+        Register a build of the index of the user
+
+        :return: Change counter to pass to finish_build
+        :rtype: int
+        """
+        self.pending[user_id] = self.pending.get(user_id, 0) + 1
+        return self.changes.setdefault(user_id, 0)
+
+    def cancel_build(self, user_id: int) -> None:
+        self.pending[user_id] -= 1
+        if not self.pending[user_id]:
+            del self.pending[user_id]
+            del self.changes[user_id]
+
+    def finish_build(self, user_id: int, rows, version: int) -> UserPrefixIndex:
+        """
+        Store index built from (id, first_name, last_name, email) rows, unless contacts of the user
+        changed since the build started
+
+        :param user_id: ID of the user
+        :type user_id: int
+        :param rows: Contacts of the user
+        :param version: Change counter returned by start_build
+        :type version: int
+        :return: The built index
+        :rtype: UserPrefixIndex
+        """
+        index = UserPrefixIndex()
+        index.load(rows)
+        fresh = self.changes[user_id] == version
+        self.cancel_build(user_id)
+        if fresh:
+            self.drop(user_id)
+            self.size += len(index)
+            self.users[user_id] = index
+            self.expires[user_id] = time.monotonic() + self.ttl
+            self._evict()
+        return index
+
+    def upsert(self, user_id: int, contact) -> None:
+        self._changed(user_id)
+        index = self.users.get(user_id)
+        if index is not None:
+            size = len(index)
+            index.upsert(contact.id, contact.first_name, contact.last_name, contact.email)
+            self.size += len(index) - size
+            self._evict()
+
+    def discard(self, user_id: int, contact_id: int) -> None:
+        self._changed(user_id)
+        index = self.users.get(user_id)
+        if index is not None:
+            size = len(index)
+            index.discard(contact_id)
+            self.size += len(index) - size
+
+    def drop(self, user_id: int) -> None:
+        """
+        Forget the index of the user, it is rebuilt on next use
+        """
+        self._changed(user_id)
+        index = self.users.pop(user_id, None)
+        if index is not None:
+            self.size -= len(index)
+            del self.expires[user_id]
+
+    def clear(self) -> None:
+        for user_id in list(self.users):
+            self.drop(user_id)
+
+    async def broadcast(self, user_id: int) -> None:
+        """
+        Tell other workers that contacts of the user changed. Best effort: the change is already
+        committed, so a Redis failure is only logged and other workers catch up when their index
+        expires.
+
+        :param user_id: ID of the user
+        :type user_id: int
+        :return: None
+        """
+        try:
+            await get_redis().publish(CHANGES_CHANNEL, f"{WORKER_ID}:{user_id}")
+        except RedisError as error:
+            logger.warning("Autocomplete change of user %s not broadcast: %s", user_id, error)
+            self.drop(user_id)
+
+    async def listen(self) -> None:
+        """
+        Drop indexes of users whose contacts were changed by other workers, runs until cancelled
+
+        :return: None
+        """
+        # Changes may have been missed while disconnected
+        await listen_channel(CHANGES_CHANNEL, self.on_change, on_disconnect=self.clear)
+
+    async def on_change(self, data: bytes | None) -> None:
+        if data is not None:
+            worker_id, user_id = data.decode().split(':')
+            if worker_id != WORKER_ID:
+                self.drop(int(user_id))
+
+    def _changed(self, user_id: int) -> None:
+        if user_id in self.changes:
+            self.changes[user_id] += 1
+
+    def _evict(self) -> None:
+        while self.size > self.max_entries and len(self.users) > 1:
+            user_id, index = self.users.popitem(last=False)
+            self.size -= len(index)
+            del self.expires[user_id]
+
+
+autocomplete_index = AutocompleteIndex(settings.autocomplete_max_entries, settings.autocomplete_ttl)
@@ -0,0 +1,57 @@
+import datetime
+
+import numpy as np
+
+from src.repository.contacts import bday_window
+
+
+def birth_mmdd(birth_dates: np.ndarray) -> np.ndarray:
+    """
+    Encode month and day of every date as month * 100 + day
+
+    Calendar conversions of datetime64 are slow, so they run only once per distinct day
+    in the range of the input and the result is gathered from that lookup table.
+    NaT dates are encoded as 0.
+
+    :param birth_dates: Array of dates
+    :type birth_dates: np.ndarray[datetime64]
+    :return: Array of month * 100 + day values
+    :rtype: np.ndarray[int]
+    """
+    days = birth_dates.astype('datetime64[D]')
+    valid = ~np.isnat(days)
+    if not valid.any():
+        return np.zeros(len(days), dtype=np.int64)
+    ordinals = days.astype(np.int64)
+    first, last = ordinals[valid].min(), ordinals[valid].max()
+    table_days = np.arange(first, last + 1).astype('datetime64[D]')
+    table_months = table_days.astype('datetime64[M]')
+    month_of_year = table_months.astype(np.int64) % 12 + 1
+    day_of_month = (table_days - table_months).astype(np.int64) + 1
+    table = month_of_year * 100 + day_of_month
+    return np.where(valid, table[np.where(valid, ordinals - first, 0)], 0)
+
+
+def upcoming_birthdays(user_ids: np.ndarray, birth_dates: np.ndarray, days: int = 7,
+                       today: datetime.date | None = None) -> np.ndarray:
+    """
+    Find rows whose birthdays are in ``days`` days range after ``today``
+
+    Uses the same window as :func:`src.repository.contacts.nearest_bdays`, but works on whole
+    columns at once, so it suits batch jobs over many users.
+
+    :param user_ids: Owner of every row
+    :type user_ids: np.ndarray[int]
+    :param birth_dates: Birth date of every row, NaT rows never match
+    :type birth_dates: np.ndarray[datetime64]
+    :param days: Length of the range in days
+    :type days: int
+    :param today: Reference date, today by default
+    :type today: datetime.date | None
+    :return: Indices of matching rows ordered by user id
+    :rtype: np.ndarray[int]
+    """
+    in_window = np.zeros(1232, dtype=bool)
+    in_window[bday_window(days, today)] = True
+    matches = np.flatnonzero(in_window[birth_mmdd(birth_dates)])
+    return matches[np.argsort(user_ids[matches], kind='stable')]
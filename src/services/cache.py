@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from src.confg.config import settings
+
+logger = logging.getLogger(__name__)
+
+LISTEN_TIMEOUT = 5.0
+
+redis_client: redis.Redis | None = None
+
+
+def get_redis() -> redis.Redis:
+    """
+    Shared async Redis client backed by a bounded connection pool, created on first use
+
+    :return: Redis client
+    :rtype: redis.Redis
+    """
+    global redis_client
+    if redis_client is None:
+        pool = redis.BlockingConnectionPool(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=0,
+            max_connections=settings.redis_max_connections,
+            timeout=settings.redis_pool_timeout,
+            socket_timeout=settings.redis_socket_timeout,
+            socket_connect_timeout=settings.redis_socket_connect_timeout,
+        )
+        redis_client = redis.Redis(connection_pool=pool)
+    return redis_client
+
+
+async def close_redis() -> None:
+    """
+    Close the shared client and disconnect all pooled connections
+
+    :return: None
+    """
+    global redis_client
+    if redis_client is not None:
+        await redis_client.close(close_connection_pool=True)
+        redis_client = None
+
+
+async def listen_channel(channel: str, handler: Callable[[bytes | None], Awaitable[None]],
+                         on_subscribe: Callable[[], Awaitable[None]] | None = None,
+                         on_disconnect: Callable[[], None] | None = None) -> None:
+    """
+    Pass messages published on the channel to the handler, reconnecting after Redis errors,
+    runs until cancelled
+
+    :param channel: Pub/sub channel
+    :type channel: str
+    :param handler: Awaited with the data of every message, and with None when no message arrived
+        within LISTEN_TIMEOUT seconds
+    :type handler: Callable[[bytes | None], Awaitable[None]]
+    :param on_subscribe: Awaited after every subscription, nothing published meanwhile is missed
+    :type on_subscribe: Callable[[], Awaitable[None]] | None
+    :param on_disconnect: Called after the connection is lost, messages may have been missed
+    :type on_disconnect: Callable[[], None] | None
+    :return: None
+    """
+    while True:
+        try:
+            async with get_redis().pubsub() as pubsub:
+                await pubsub.subscribe(channel)
+                if on_subscribe is not None:
+                    await on_subscribe()
+                while True:
+                    # An explicit timeout, otherwise an idle channel hits the pool socket timeout
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=LISTEN_TIMEOUT)
+                    await handler(message['data'] if message is not None else None)
+        except RedisError as error:
+            logger.warning("Listener of %s disconnected: %s", channel, error)
+            if on_disconnect is not None:
+                on_disconnect()
+            await asyncio.sleep(1)
@@ -1,12 +1,21 @@
+import logging
 from pathlib import Path
+from typing import Callable
+
+from aiosmtplib import SMTPRecipientRefused, SMTPRecipientsRefused
 
 from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
+from fastapi_mail.fastmail import email_dispatched
+from fastapi_mail.connection import Connection
+from fastapi_mail.msg import MailMsg
 from fastapi_mail.errors import ConnectionErrors
 from pydantic import EmailStr
 
 from src.confg.config import settings
 from src.services.auth import auth_service
 
+logger = logging.getLogger(__name__)
+
 conf = ConnectionConfig(
     MAIL_USERNAME=settings.mail_username,
     MAIL_PASSWORD=settings.mail_password,
@@ -44,3 +53,44 @@ async def send_email(email: EmailStr, username: str, host: str):
         await fm.send_message(message, template_name="email_template.html")
     except ConnectionErrors as err:
         print(err)
+
+
+async def send_birthday_digests(digests: list[dict], days: int, on_done: Callable[[dict], None] | None = None) -> int:
+    """
+    Send upcoming birthday digests to several users over a single SMTP connection.
+    Recipients refused by the server are logged and skipped.
+
+    :param digests: Dicts with ``email``, ``username`` and ``contacts`` of every recipient
+    :type digests: list[dict]
+    :param days: Length of the birthday range in days
+    :type days: int
+    :param on_done: Called with every digest once it is sent or skipped
+    :type on_done: Callable[[dict], None] | None
+    :return: Number of sent digests
+    :rtype: int
+    """
+    template = conf.template_engine().get_template("birthday_digest.html")
+    sender = f"{conf.MAIL_FROM_NAME} <{conf.MAIL_FROM}>"
+    sent = 0
+    # FastMail.send_message() opens a connection per message, so the batch goes through
+    # the internals of the fastapi-mail version pinned in pyproject.toml
+    async with Connection(conf) as connection:
+        for digest in digests:
+            message = MessageSchema(
+                subject="Upcoming birthdays",
+                recipients=[digest["email"]],
+                body=template.render(username=digest["username"], contacts=digest["contacts"], days=days),
+                subtype=MessageType.html
+            )
+            msg = await MailMsg(message)._message(sender)
+            try:
+                if not conf.SUPPRESS_SEND:
+                    await connection.session.send_message(msg)
+            except (SMTPRecipientRefused, SMTPRecipientsRefused) as error:
+                logger.warning("Birthday digest to %s not sent: %s", digest["email"], error)
+            else:
+                email_dispatched.send(msg)
+                sent += 1
+            if on_done is not None:
+                on_done(digest)
+    return sent
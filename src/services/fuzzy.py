@@ -0,0 +1,103 @@
+import re
+from collections import defaultdict
+
+WORD = re.compile(r'[^\W_]+')
+NOT_DIGIT = re.compile(r'\D')
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    Split text into trigrams the same way as Postgres pg_trgm does
+
+    Every lowercased word is padded with two spaces in front and one behind.
+
+    :param text: Text to split
+    :type text: str
+    :return: Set of trigrams
+    :rtype: set[str]
+    """
+    result = set()
+    for word in WORD.findall(text.lower()):
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def word_similarity(query: set[str], text: set[str]) -> float:
+    """
+    Share of query trigrams found in the text, an approximation of pg_trgm ``word_similarity()``
+
+    :param query: Trigrams of the query
+    :type query: set[str]
+    :param text: Trigrams of the searched text
+    :type text: set[str]
+    :return: Similarity from 0 to 1
+    :rtype: float
+    """
+    if not query:
+        return 0.0
+    return len(query & text) / len(query)
+
+
+def digits(text: str | None) -> str:
+    """
+    Keep only digits of a phone number
+
+    :type text: str | None
+    :rtype: str
+    """
+    return NOT_DIGIT.sub('', text or '')
+
+
+class TrigramIndex:
+    """
+    In-memory trigram index over several text fields of documents, used where pg_trgm is not available
+    """
+
+    def __init__(self, threshold: float = 0.5):
+        self.threshold = threshold
+        self.postings = defaultdict(set)
+        self.documents = {}
+
+    def add(self, key, texts: list[str], phone: str | None = None) -> None:
+        """
+        Index a document
+
+        :param key: Document identifier
+        :param texts: Text fields of the document
+        :type texts: list[str]
+        :param phone: Phone number matched by digits substring
+        :type phone: str | None
+        """
+        grams = [trigrams(text or '') for text in texts]
+        self.documents[key] = (grams, digits(phone))
+        for gram_set in grams:
+            for gram in gram_set:
+                self.postings[gram].add(key)
+
+    def search(self, query: str, limit: int = 20) -> list[tuple]:
+        """
+        Rank documents by the best trigram word similarity of any field to the query
+
+        :param query: Text to search for
+        :type query: str
+        :param limit: Maximal number of results
+        :type limit: int
+        :return: Pairs of document key and score, best first
+        :rtype: list[tuple]
+        """
+        query_grams = trigrams(query)
+        query_digits = digits(query)
+        candidates = set().union(*(self.postings.get(gram, ()) for gram in query_grams))
+        if len(query_digits) >= 3:
+            candidates.update(key for key, (_, phone) in self.documents.items() if query_digits in phone)
+        ranked = []
+        for key in candidates:
+            grams, phone = self.documents[key]
+            score = max((word_similarity(query_grams, gram_set) for gram_set in grams), default=0.0)
+            if len(query_digits) >= 3 and query_digits in phone:
+                score = 1.0
+            if score >= self.threshold:
+                ranked.append((key, score))
+        ranked.sort(key=lambda item: -item[1])
+        return ranked[:limit]
@@ -0,0 +1,93 @@
+import pathlib
+
+from jose import jwk, jwt, JWTError
+
+from src.confg.config import settings
+
+
+class KeyRing:
+    """
+    Keys tokens are signed and verified with
+
+    With an HMAC algorithm (HS256) a single shared secret is used. With RS256 or ES256 tokens are
+    signed by the active private key and carry its ``kid`` in the header, and any published public
+    key verifies them. To rotate, publish the new public key, wait for the JWKS cache to expire,
+    switch signing to the new key and drop the old public key once its tokens have expired.
+    """
+
+    def __init__(self, algorithm: str, secret_key: str, private_key: str | None = None, key_id: str | None = None,
+                 public_keys: dict[str, str] | None = None):
+        self.algorithm = algorithm
+        self.verification_keys = {}
+        if self.symmetric:
+            self.signing_key = secret_key
+            self.key_id = None
+            return
+        if private_key is None or key_id is None:
+            raise ValueError(f"{algorithm} needs a private key and its key id")
+        self.signing_key = private_key
+        self.key_id = key_id
+        for kid, public_key in (public_keys or {}).items():
+            key = jwk.construct(public_key, algorithm)
+            # The file of a retired key may hold the private key, publish only its public part
+            self.verification_keys[kid] = key if key.is_public() else key.public_key()
+        self.verification_keys[key_id] = jwk.construct(private_key, algorithm).public_key()
+
+    @property
+    def symmetric(self) -> bool:
+        return self.algorithm.startswith('HS')
+
+    def sign(self, claims: dict) -> str:
+        """
+        Encode claims into a signed token
+
+        :param claims: Claims of the token
+        :type claims: dict
+        :return: encoded token
+        :rtype: str
+        """
+        headers = {'kid': self.key_id} if self.key_id else None
+        return jwt.encode(claims, self.signing_key, algorithm=self.algorithm, headers=headers)
+
+    def verify(self, token: str) -> dict:
+        """
+        Verify signature and expiration of the token
+
+        :param token: Encoded token
+        :type token: str
+        :return: claims of the token
+        :rtype: dict
+        :raises JWTError: the token is invalid, expired or signed by an unknown key
+        """
+        if self.symmetric:
+            return jwt.decode(token, self.signing_key, algorithms=[self.algorithm])
+        key = self.verification_keys.get(jwt.get_unverified_header(token).get('kid'))
+        if key is None:
+            raise JWTError('Unknown signing key')
+        return jwt.decode(token, key, algorithms=[self.algorithm])
+
+    def jwks(self) -> dict:
+        """
+        Public verification keys as a JSON Web Key Set, empty for a shared secret
+
+        :return: JWKS document
+        :rtype: dict
+        """
+        return {'keys': [{**key.to_dict(), 'kid': kid, 'use': 'sig'} for kid, key in self.verification_keys.items()]}
+
+
+def load_key_ring() -> KeyRing:
+    """
+    Build key ring from settings, reading keys from PEM files
+
+    :return: key ring
+    :rtype: KeyRing
+    """
+    private_key = None
+    if settings.jwt_private_key_file:
+        private_key = pathlib.Path(settings.jwt_private_key_file).read_text()
+    public_keys = {kid: pathlib.Path(path).read_text() for kid, path in settings.jwt_public_key_files.items()}
+    return KeyRing(settings.algorithm, settings.secret_key, private_key, settings.jwt_key_id, public_keys)
+
+
+key_ring = load_key_ring()
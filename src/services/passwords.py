@@ -0,0 +1,119 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from src.confg.config import settings
+
+
+def build_context(schemes: list[str], bcrypt_rounds: int, argon2_time_cost: int, argon2_memory_cost: int,
+                  argon2_parallelism: int) -> CryptContext:
+    """
+    Create password context hashing with the first scheme. Hashes of the other schemes or with
+    weaker cost parameters still verify, but are reported as needing an update.
+
+    :param schemes: Accepted hashing schemes, preferred first
+    :type schemes: list[str]
+    :param bcrypt_rounds: log2 of bcrypt iterations
+    :type bcrypt_rounds: int
+    :param argon2_time_cost: argon2 iterations
+    :type argon2_time_cost: int
+    :param argon2_memory_cost: argon2 memory in KiB
+    :type argon2_memory_cost: int
+    :param argon2_parallelism: argon2 lanes
+    :type argon2_parallelism: int
+    :return: password context
+    :rtype: CryptContext
+    """
+    options = {}
+    if 'bcrypt' in schemes:
+        options.update(bcrypt__rounds=bcrypt_rounds, bcrypt__min_rounds=bcrypt_rounds)
+    if 'argon2' in schemes:
+        options.update(argon2__time_cost=argon2_time_cost, argon2__memory_cost=argon2_memory_cost,
+                       argon2__parallelism=argon2_parallelism)
+    return CryptContext(schemes=schemes, deprecated="auto", **options)
+
+
+pwd_context = build_context(settings.password_schemes, settings.bcrypt_rounds, settings.argon2_time_cost,
+                            settings.argon2_memory_cost, settings.argon2_parallelism)
+
+
+def hash_password(password: str) -> str:
+    """
+    Hash the password, blocking
+
+    :rtype: str
+    """
+    return pwd_context.hash(password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Verifies password and rehashes it when the stored hash uses outdated scheme or cost, blocking
+
+    :return: Is the password correct and the new hash, if it has to be replaced
+    :rtype: tuple[bool, str | None]
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Runs password hashing in a bounded executor so it never blocks the event loop
+    """
+
+    def __init__(self, executor: Executor, max_pending: int):
+        self.executor = executor
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+
+    async def run(self, func, *args):
+        """
+        Run blocking password function in the executor
+
+        :raises HTTPException: 503 when too many operations are already waiting
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Too many authentication requests, try again later",
+                                headers={"Retry-After": "1"})
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+            self.busy_seconds += time.perf_counter() - start
+
+    async def hash(self, password: str) -> str:
+        return await self.run(hash_password, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        return await self.run(verify_and_update_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        """
+        Current queue depth and counters
+
+        :return: password hashing statistics
+        :rtype: dict
+        """
+        return {
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'avg_seconds': self.busy_seconds / self.completed if self.completed else 0.0,
+        }
+
+
+executor_class = ProcessPoolExecutor if settings.password_hash_use_processes else ThreadPoolExecutor
+password_hasher = PasswordHasher(executor_class(max_workers=settings.password_hash_workers),
+                                 settings.password_hash_max_pending)
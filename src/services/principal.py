@@ -0,0 +1,46 @@
+import json
+from dataclasses import dataclass
+
+# Bump when the layout of the cached payload changes, older entries are then treated as misses
+CACHE_VERSION = 1
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """
+    Read-only authenticated user, without password hash, tokens or ORM state
+    """
+    id: int
+    email: str
+    username: str
+    confirmed: bool
+    avatar: str | None
+
+    @classmethod
+    def from_user(cls, user) -> 'Principal':
+        return cls(user.id, user.email, user.username, bool(user.confirmed), user.avatar)
+
+
+def dump_principal(principal: Principal) -> bytes:
+    """
+    Serialize principal to a compact positional payload prefixed with CACHE_VERSION
+
+    :rtype: bytes
+    """
+    return json.dumps([CACHE_VERSION, principal.id, principal.email, principal.username, principal.confirmed,
+                       principal.avatar], separators=(',', ':')).encode()
+
+
+def load_principal(payload: bytes) -> Principal | None:
+    """
+    Deserialize principal, None when the payload has another version or can not be read
+
+    :rtype: Principal | None
+    """
+    try:
+        version, *fields = json.loads(payload)
+    except (ValueError, TypeError):
+        return None
+    if version != CACHE_VERSION:
+        return None
+    return Principal(*fields)
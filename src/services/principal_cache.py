@@ -0,0 +1,160 @@
+import logging
+import time
+from collections import OrderedDict
+
+from redis.exceptions import RedisError
+
+from src.confg.config import settings
+from src.services.cache import get_redis, listen_channel
+from src.services.principal import Principal, dump_principal, load_principal
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = 'user:invalidate'
+
+
+class PrincipalCache:
+    """
+    Two-tier cache of authenticated principals keyed by user id: a small in-process LRU with TTL
+    in front of Redis. Changes of a user are broadcast over Redis pub/sub, so every worker
+    drops its local copy.
+    """
+
+    def __init__(self, max_size: int, local_ttl: float, redis_ttl: int):
+        self.max_size = max_size
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.local = OrderedDict()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(user_id: int) -> str:
+        return f"user:{user_id}"
+
+    async def get(self, user_id: int) -> Principal | None:
+        """
+        Find principal in the local tier, then in Redis
+
+        :param user_id: ID of the user
+        :type user_id: int
+        :return: cached principal or None
+        :rtype: Principal | None
+        """
+        entry = self.local.get(user_id)
+        if entry is not None:
+            principal, expires_at = entry
+            if expires_at > time.monotonic():
+                self.local.move_to_end(user_id)
+                self.local_hits += 1
+                return principal
+            del self.local[user_id]
+
+        redis_client = get_redis()
+        payload = await redis_client.get(self.key(user_id))
+        principal = load_principal(payload) if payload is not None else None
+        if principal is None:
+            if payload is not None:
+                # Unreadable entry of an older layout would block fill() until it expires
+                await redis_client.delete(self.key(user_id))
+            self.misses += 1
+            return None
+        self.redis_hits += 1
+        self._remember(principal)
+        return principal
+
+    async def set(self, principal: Principal) -> None:
+        """
+        Store principal in both tiers
+
+        :param principal: Principal to cache
+        :type principal: Principal
+        :return: None
+        """
+        await get_redis().set(self.key(principal.id), dump_principal(principal), ex=self.redis_ttl)
+        self._remember(principal)
+
+    async def fill(self, principal: Principal) -> None:
+        """
+        Store principal read from the database on a cache miss, unless the entry was written
+        meanwhile. The row may have been read before a concurrent change committed, so only
+        refresh() overwrites an existing entry.
+
+        :param principal: Principal loaded from the database
+        :type principal: Principal
+        :return: None
+        """
+        if await get_redis().set(self.key(principal.id), dump_principal(principal), ex=self.redis_ttl, nx=True):
+            self._remember(principal)
+
+    async def invalidate(self, user_id: int) -> None:
+        """
+        Remove principal from Redis and from the local tier of every worker. Best effort: when
+        Redis is unavailable only the local copy is dropped.
+
+        :param user_id: ID of the changed user
+        :type user_id: int
+        :return: None
+        """
+        self.local.pop(user_id, None)
+        try:
+            redis_client = get_redis()
+            await redis_client.delete(self.key(user_id))
+            await redis_client.publish(INVALIDATION_CHANNEL, user_id)
+        except RedisError as error:
+            logger.warning("Principal of user %s not invalidated in Redis: %s", user_id, error)
+
+    async def refresh(self, principal: Principal) -> None:
+        """
+        Write changed principal through to Redis and drop stale copies from the local tier
+        of every worker. The change is already committed, so on a Redis failure the principal
+        is invalidated instead of raising.
+
+        :param principal: Principal built from the changed user
+        :type principal: Principal
+        :return: None
+        """
+        try:
+            await self.set(principal)
+            await get_redis().publish(INVALIDATION_CHANNEL, principal.id)
+        except RedisError as error:
+            logger.warning("Principal of user %s not refreshed: %s", principal.id, error)
+            await self.invalidate(principal.id)
+
+    async def listen(self) -> None:
+        """
+        Drop local entries of users changed by other workers, runs until cancelled
+
+        :return: None
+        """
+        # Invalidations may have been missed while disconnected
+        await listen_channel(INVALIDATION_CHANNEL, self.on_invalidation, on_disconnect=self.local.clear)
+
+    async def on_invalidation(self, data: bytes | None) -> None:
+        if data is not None:
+            self.local.pop(int(data), None)
+
+    def stats(self) -> dict:
+        """
+        Size and hit/miss counters of the cache
+
+        :return: principal cache statistics
+        :rtype: dict
+        """
+        return {
+            'local_size': len(self.local),
+            'local_hits': self.local_hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+        }
+
+    def _remember(self, principal: Principal) -> None:
+        self.local[principal.id] = (principal, time.monotonic() + self.local_ttl)
+        self.local.move_to_end(principal.id)
+        while len(self.local) > self.max_size:
+            self.local.popitem(last=False)
+
+
+principal_cache = PrincipalCache(settings.principal_cache_size, settings.principal_cache_local_ttl,
+                                 settings.principal_cache_ttl)
@@ -0,0 +1,86 @@
+import uuid
+
+from fastapi import HTTPException, status
+
+from src.confg.config import settings
+from src.services.cache import get_redis
+
+# Moves the family to the next generation only if the presented token is its latest one.
+# An older generation means a stolen token was replayed, so the whole family is revoked.
+ROTATE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if not current then
+    return -1
+end
+if current ~= ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return -2
+end
+local generation = tonumber(current) + 1
+redis.call('SET', KEYS[1], generation, 'EX', ARGV[2])
+return generation
+"""
+
+UNKNOWN_FAMILY = -1
+REUSED_TOKEN = -2
+
+
+class RefreshTokenStore:
+    """
+    Refresh token families kept in Redis
+
+    Every login starts a family; its refresh tokens carry the family id (``fam``) and a rotation
+    counter (``gen``). Only the latest generation can be exchanged, and the family expires
+    together with its last refresh token.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    @staticmethod
+    def key(family: str) -> str:
+        return f"refresh:{family}"
+
+    async def start(self) -> dict:
+        """
+        Start a new token family
+
+        :return: claims to put into the first refresh token of the family
+        :rtype: dict
+        """
+        family = uuid.uuid4().hex
+        await get_redis().set(self.key(family), 0, ex=self.ttl)
+        return {"fam": family, "gen": 0}
+
+    async def rotate(self, family: str | None, generation: int | None) -> dict:
+        """
+        Atomically check the presented token is the latest of its family and advance the family
+
+        :param family: Family id of the presented refresh token
+        :type family: str | None
+        :param generation: Rotation counter of the presented refresh token
+        :type generation: int | None
+        :return: claims to put into the next refresh token
+        :rtype: dict
+        :raises HTTPException: 401 if the family is unknown, expired or the token was already used
+        """
+        if family is None or generation is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+        rotate = get_redis().register_script(ROTATE_SCRIPT)
+        result = await rotate(keys=[self.key(family)], args=[generation, self.ttl])
+        if result in (UNKNOWN_FAMILY, REUSED_TOKEN):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+        return {"fam": family, "gen": result}
+
+    async def revoke(self, family: str) -> None:
+        """
+        Invalidate every refresh token of the family, e.g. on logout
+
+        :param family: Family id
+        :type family: str
+        :return: None
+        """
+        await get_redis().delete(self.key(family))
+
+
+refresh_token_store = RefreshTokenStore(settings.refresh_token_ttl)
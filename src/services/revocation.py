@@ -0,0 +1,124 @@
+import hashlib
+import math
+import time
+
+from src.confg.config import settings
+from src.services.cache import get_redis, listen_channel
+
+REVOCATION_CHANNEL = 'token:revoke'
+
+
+class BloomFilter:
+    """
+    Set membership with false positives but no false negatives, in a fixed amount of memory
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    """
+    Revoked access tokens by ``jti``
+
+    Redis keeps every revoked id until the token would have expired anyway. Each worker mirrors
+    the ids into a Bloom filter kept current over pub/sub, so a token that was never revoked is
+    accepted without any I/O and Redis is only asked on a filter match.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, rebuild_interval: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.ready = False
+        self.rebuilt_at = 0.0
+
+    @staticmethod
+    def key(jti: str) -> str:
+        return f"revoked:{jti}"
+
+    async def revoke(self, jti: str, exp: float) -> None:
+        """
+        Revoke token until its expiration
+
+        :param jti: Token id
+        :type jti: str
+        :param exp: Expiration of the token, unix time
+        :type exp: float
+        :return: None
+        """
+        ttl = math.ceil(exp - time.time())
+        if ttl <= 0:
+            return
+        redis_client = get_redis()
+        await redis_client.set(self.key(jti), 1, ex=ttl)
+        await redis_client.publish(REVOCATION_CHANNEL, jti)
+        self.bloom.add(jti)
+
+    async def is_revoked(self, jti: str) -> bool:
+        """
+        Check whether token was revoked
+
+        :param jti: Token id
+        :type jti: str
+        :return: Is the token revoked
+        :rtype: bool
+        """
+        if self.ready and jti not in self.bloom:
+            return False
+        return bool(await get_redis().exists(self.key(jti)))
+
+    async def rebuild(self) -> None:
+        """
+        Replace the Bloom filter with one holding only the ids still revoked in Redis,
+        which also forgets ids of expired tokens
+
+        :return: None
+        """
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        async for key in get_redis().scan_iter(match=self.key('*'), count=1000):
+            bloom.add(key.decode().removeprefix(self.key('')))
+        self.bloom = bloom
+        self.ready = True
+        self.rebuilt_at = time.monotonic()
+
+    async def listen(self) -> None:
+        """
+        Add ids revoked by other workers to the Bloom filter and rebuild it periodically,
+        runs until cancelled
+
+        :return: None
+        """
+        # Rebuilt after subscribing, so nothing revoked during the rebuild is missed
+        await listen_channel(REVOCATION_CHANNEL, self.on_revocation, on_subscribe=self.rebuild,
+                             on_disconnect=self.on_disconnect)
+
+    async def on_revocation(self, data: bytes | None) -> None:
+        if data is not None:
+            self.bloom.add(data.decode())
+        if time.monotonic() - self.rebuilt_at > self.rebuild_interval:
+            await self.rebuild()
+
+    def on_disconnect(self) -> None:
+        # Revocations may have been missed while disconnected, ask Redis until rebuilt
+        self.ready = False
+
+
+revocation_list = RevocationList(settings.revocation_bloom_capacity, settings.revocation_bloom_error_rate,
+                                 settings.revocation_rebuild_interval)
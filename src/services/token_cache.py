@@ -0,0 +1,71 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+from src.confg.config import settings
+
+
+class VerifiedTokenCache:
+    """
+    Claims of already verified tokens keyed by the token digest, kept until the token expires.
+    Only the SHA-256 of the whole token, signature included, is stored, so a changed token
+    never matches an entry.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> dict | None:
+        """
+        Claims of the token if it was verified before and is not expired yet
+
+        :param token: Encoded JWT
+        :type token: str
+        :return: decoded claims or None
+        :rtype: dict | None
+        """
+        key = self.digest(token)
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry['exp'] > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, token: str, claims: dict) -> None:
+        """
+        Remember claims of a verified token, evicting the least recently used entries
+
+        :param token: Encoded JWT
+        :type token: str
+        :param claims: Claims returned by jwt.decode
+        :type claims: dict
+        :return: None
+        """
+        if 'exp' not in claims:
+            return
+        self.entries[self.digest(token)] = claims
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        Size and hit/miss counters of the cache
+
+        :return: token cache statistics
+        :rtype: dict
+        """
+        return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+token_cache = VerifiedTokenCache(settings.token_cache_size)
@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+
+import pytest
+from fastapi import Request, Response
+from fastapi_limiter.depends import RateLimiter
+
+from main import app
+from src.confg.config import settings
+from src.database.models import Contact, User
+from src.repository import contacts as repos_contacts
+from src.services.auth import auth_service
+from src.services.principal import Principal
+
+
+@pytest.fixture(scope="module")
+def principal(session):
+    current_user = User(username="contacts_owner", email="owner@example.com", password="hash", confirmed=True)
+    session.add(current_user)
+    session.flush()
+    session.add_all([Contact(first_name="Bruce", last_name="Wayne", email="bruce@mail.com", user_id=current_user.id),
+                     Contact(first_name="Bruno", last_name="Mars", email="mars@mail.com", user_id=current_user.id),
+                     Contact(first_name="Clark", last_name="Kent", email="clark@mail.com", user_id=current_user.id)])
+    session.commit()
+    principal = Principal.from_user(current_user)
+    app.dependency_overrides[auth_service.get_token_principal] = lambda: principal
+    yield principal
+    del app.dependency_overrides[auth_service.get_token_principal]
+
+
+def test_autocomplete_disabled_falls_back_to_search(client, principal, monkeypatch):
+    monkeypatch.setattr(settings, "autocomplete_enabled", False)
+    response = client.get("/api/contacts/autocomplete", params={"prefix": "bru"})
+    assert response.status_code == 200, response.text
+    assert [contact["first_name"] for contact in response.json()] == ["Bruce", "Bruno"]
+    assert set(response.json()[0]) == {"id", "first_name", "last_name", "email"}
+
+
+@pytest.fixture
+def export_batches(monkeypatch):
+    async def no_limit(self, request: Request, response: Response):
+        pass
+
+    async def stream_contacts(current_user, db):
+        async for rows in original_stream_contacts(current_user, db, batch_size=2):
+            batches.append(rows)
+            yield rows
+
+    original_stream_contacts = repos_contacts.stream_contacts
+    batches = []
+    monkeypatch.setattr(RateLimiter, "__call__", no_limit)
+    monkeypatch.setattr("src.routes.contacts.repos_contacts.stream_contacts", stream_contacts)
+    return batches
+
+
+def test_export_ndjson(client, principal, export_batches):
+    response = client.get("/api/contacts/export")
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["first_name"] for row in rows] == ["Bruce", "Bruno", "Clark"]
+    assert set(rows[0]) == set(repos_contacts.EXPORT_FIELDS)
+    assert [len(rows) for rows in export_batches] == [2, 1]
+
+
+def test_export_csv(client, principal, export_batches):
+    response = client.get("/api/contacts/export", params={"format": "csv"})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == 'attachment; filename="contacts.csv"'
+    reader = csv.DictReader(io.StringIO(response.text))
+    assert reader.fieldnames == list(repos_contacts.EXPORT_FIELDS)
+    assert [row["email"] for row in reader] == ["bruce@mail.com", "mars@mail.com", "clark@mail.com"]
+    assert [len(rows) for rows in export_batches] == [2, 1]
@@ -1,5 +1,12 @@
-from unittest.mock import MagicMock
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from jose import jwt
+
+from src.confg.config import settings
 from src.database.models import User
+from src.services.auth import auth_service
 
 
 def test_create_user(client, user, monkeypatch):
@@ -39,6 +46,7 @@ def test_login_user_not_confirmed_email(client, user, monkeypatch):
 def test_login_user(client, user, session):
     current_user: User = session.query(User).filter(User.email == user.get('email')).first()
     current_user.confirmed = True
+    session.commit()
     response = client.post("/api/auth/login", data={"username": user.get("email"), "password": user.get("password")})
     assert response.status_code == 200, response.text
     data = response.json()
@@ -48,6 +56,7 @@ def test_login_user(client, user, session):
 def test_login_user_wrong_password(client, user, session):
     current_user: User = session.query(User).filter(User.email == user.get('email')).first()
     current_user.confirmed = True
+    session.commit()
     response = client.post("/api/auth/login",
                            data={"username": user.get("email"), "password": "password"})
     assert response.status_code == 401, response.text
@@ -58,8 +67,67 @@ def test_login_user_wrong_password(client, user, session):
 def test_login_user_wrong_email(client, user, session):
     current_user: User = session.query(User).filter(User.email == user.get('email')).first()
     current_user.confirmed = True
+    session.commit()
     response = client.post("/api/auth/login",
                            data={"username": "some_email@test.com", "password": user.get("password")})
     assert response.status_code == 401, response.text
     data = response.json()
     assert data["detail"] == "Invalid email"
+
+
+@pytest.fixture
+def redis_refresh_tokens(monkeypatch):
+    monkeypatch.setattr(settings, "refresh_tokens_in_redis", True)
+    monkeypatch.setattr(settings, "stateless_principal", True)
+    store = MagicMock(start=AsyncMock(return_value={"fam": "family", "gen": 0}),
+                      rotate=AsyncMock(return_value={"fam": "family", "gen": 1}),
+                      revoke=AsyncMock())
+    monkeypatch.setattr("src.routes.users.refresh_token_store", store)
+    monkeypatch.setattr("src.services.auth.principal_cache", MagicMock(get=AsyncMock(return_value=None),
+                                                                       fill=AsyncMock()))
+    monkeypatch.setattr("src.services.auth.revocation_list", MagicMock(revoke=AsyncMock()))
+    return store
+
+
+def test_refresh_token_in_redis_reads_current_user(client, user, session, redis_refresh_tokens):
+    response = client.post("/api/auth/login", data={"username": user.get("email"), "password": user.get("password")})
+    assert response.status_code == 200, response.text
+    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
+    current_user.username = "renamed"
+    session.commit()
+
+    response = client.get("/api/auth/refresh_token",
+                          headers={"Authorization": f"Bearer {response.json()['refresh_token']}"})
+    assert response.status_code == 200, response.text
+    redis_refresh_tokens.rotate.assert_awaited_once_with("family", 0)
+    claims = jwt.get_unverified_claims(response.json()["access_token"])
+    assert claims["username"] == "renamed"
+    assert claims["fam"] == "family"
+
+
+def test_refresh_token_in_redis_of_deleted_user(client, redis_refresh_tokens):
+    token = asyncio.run(auth_service.create_refresh_token(data={"sub": "999", "fam": "family", "gen": 0}))
+    response = client.get("/api/auth/refresh_token", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401, response.text
+    redis_refresh_tokens.revoke.assert_awaited_once_with("family")
+    redis_refresh_tokens.rotate.assert_not_awaited()
+
+
+def test_logout_revokes_refresh_token_family(client, user, redis_refresh_tokens):
+    response = client.post("/api/auth/login", data={"username": user.get("email"), "password": user.get("password")})
+    response = client.post("/api/auth/logout",
+                           headers={"Authorization": f"Bearer {response.json()['access_token']}"})
+    assert response.status_code == 204, response.text
+    redis_refresh_tokens.revoke.assert_awaited_once_with("family")
+
+
+def test_logout_clears_refresh_token(client, user, session, monkeypatch):
+    monkeypatch.setattr("src.services.auth.revocation_list", MagicMock(revoke=AsyncMock()))
+    tokens = client.post("/api/auth/login",
+                         data={"username": user.get("email"), "password": user.get("password")}).json()
+    response = client.post("/api/auth/logout", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    assert response.status_code == 204, response.text
+    session.expire_all()
+    assert session.query(User).filter(User.email == user.get('email')).first().refresh_token is None
+    response = client.get("/api/auth/refresh_token", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == 401, response.text
@@ -0,0 +1,99 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from redis.exceptions import RedisError
+
+from src.services.autocomplete import AutocompleteIndex, UserPrefixIndex, WORKER_ID
+
+
+def contact(contact_id, first_name, last_name, email):
+    return SimpleNamespace(id=contact_id, first_name=first_name, last_name=last_name, email=email)
+
+
+class TestAutocomplete(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = AutocompleteIndex(max_entries=100, ttl=300)
+        version = self.index.start_build(1)
+        self.index.finish_build(1, [(1, "John", "Wayne", "john.wayne@mail.com"),
+                                    (2, "Mary", "Johnson", "mary@mail.com")], version)
+
+    def test_prefix_search(self):
+        result = self.index.get(1).search("Jo", limit=10)
+        self.assertEqual([suggestion["id"] for suggestion in result], [1, 2])
+        self.assertEqual(self.index.get(1).search("wayne", limit=10)[0]["id"], 1)
+        self.assertEqual(self.index.get(1).search("zz", limit=10), [])
+        self.assertEqual(len(self.index.get(1).search("jo", limit=1)), 1)
+
+    def test_upsert_and_discard(self):
+        self.index.upsert(1, contact(2, "Mary", "Smith", "mary@mail.com"))
+        self.assertEqual(self.index.get(1).search("johnson", limit=10), [])
+        self.assertEqual(self.index.get(1).search("smi", limit=10)[0]["last_name"], "Smith")
+        self.index.discard(1, 1)
+        self.assertEqual(self.index.get(1).search("john", limit=10), [])
+        self.assertEqual(self.index.size, len(self.index.get(1)))
+
+    def test_build_discarded_when_contacts_changed(self):
+        version = self.index.start_build(2)
+        self.index.upsert(2, contact(3, "Jim", "Beam", "jim@mail.com"))
+        built = self.index.finish_build(2, [], version)
+        self.assertIsInstance(built, UserPrefixIndex)
+        self.assertIsNone(self.index.get(2))
+        self.assertEqual(self.index.changes, {})
+
+    def test_overlapping_builds(self):
+        first = self.index.start_build(2)
+        self.index.upsert(2, contact(3, "Jim", "Beam", "jim@mail.com"))
+        second = self.index.start_build(2)
+        self.index.finish_build(2, [], first)
+        self.assertIsNone(self.index.get(2))
+        self.index.finish_build(2, [(3, "Jim", "Beam", "jim@mail.com")], second)
+        self.assertEqual(self.index.get(2).search("jim", limit=10)[0]["id"], 3)
+
+    def test_expired_index_dropped(self):
+        index = AutocompleteIndex(max_entries=100, ttl=-1)
+        index.finish_build(1, [(1, "John", "Wayne", "john@mail.com")], index.start_build(1))
+        self.assertIsNone(index.get(1))
+        self.assertEqual(index.size, 0)
+
+    def test_least_recently_used_user_evicted(self):
+        index = AutocompleteIndex(max_entries=10, ttl=300)
+        for user_id in (1, 2, 3):
+            version = index.start_build(user_id)
+            index.finish_build(user_id, [(user_id, "John", "Wayne", "john@mail.com")], version)
+            index.get(1)
+        self.assertIsNotNone(index.get(1))
+        self.assertIsNone(index.get(2))
+        self.assertLessEqual(index.size, 10)
+
+
+class TestAutocompleteChanges(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.index = AutocompleteIndex(max_entries=100, ttl=300)
+        for user_id in (1, 2):
+            self.index.finish_build(user_id, [(user_id, "John", "Wayne", "john@mail.com")],
+                                    self.index.start_build(user_id))
+        self.redis = AsyncMock()
+        patcher = patch("src.services.autocomplete.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_broadcast(self):
+        await self.index.broadcast(1)
+        self.redis.publish.assert_awaited_once_with("contacts:changed", f"{WORKER_ID}:1")
+
+    async def test_broadcast_failure_drops_local_index(self):
+        self.index.finish_build(1, [(1, "Bruce", "Wayne", None)], self.index.start_build(1))
+        self.redis.publish.side_effect = RedisError("Too many connections")
+        with self.assertLogs('src.services.autocomplete', level='WARNING'):
+            await self.index.broadcast(1)
+        self.assertIsNone(self.index.get(1))
+
+    async def test_changes_of_other_workers_drop_index(self):
+        version = self.index.start_build(2)
+        self.index.finish_build(2, [(3, "Bruce", "Wayne", None)], version)
+        await self.index.on_change(b"other:1")
+        await self.index.on_change(f"{WORKER_ID}:2".encode())
+        await self.index.on_change(None)
+        self.assertIsNone(self.index.get(1))
+        self.assertIsNotNone(self.index.get(2))
@@ -0,0 +1,59 @@
+import datetime
+import pathlib
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import birthday_digest
+
+
+def row(user_id, first_name):
+    return SimpleNamespace(user_id=user_id, user_email=f"user{user_id}@mail.com", username=f"user_{user_id}",
+                           first_name=first_name, last_name="Wayne", birth_date=datetime.datetime(1990, 5, 18))
+
+
+class TestBirthdayDigest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.checkpoint = pathlib.Path(self.tmp_dir.name) / 'checkpoint.json'
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_build_digests(self):
+        digests = birthday_digest.build_digests([row(1, "John"), row(1, "Jane"), row(2, "Jim")])
+        self.assertEqual([digest['user_id'] for digest in digests], [1, 2])
+        self.assertEqual([contact['first_name'] for contact in digests[0]['contacts']], ["John", "Jane"])
+        self.assertEqual(digests[0]['contacts'][0]['birth_date'], "18.05")
+
+    def test_checkpoint_of_other_day_ignored(self):
+        birthday_digest.save_checkpoint(self.checkpoint, datetime.date(2023, 5, 1), 10)
+        self.assertEqual(birthday_digest.load_checkpoint(self.checkpoint, datetime.date(2023, 5, 1)), 10)
+        self.assertEqual(birthday_digest.load_checkpoint(self.checkpoint, datetime.date(2023, 5, 2)), 0)
+
+    async def test_run_saves_progress_per_user_and_resumes(self):
+        rows = [row(1, "John"), row(2, "Jane"), row(3, "Jim")]
+        get_rows = AsyncMock(side_effect=lambda db, days, after_user_id: [r for r in rows if r.user_id > after_user_id])
+        sent = []
+        disconnects = [2]
+
+        async def send(digests, days, on_done):
+            for digest in digests:
+                if digest['user_id'] in disconnects:
+                    disconnects.remove(digest['user_id'])
+                    raise ConnectionError()
+                sent.append(digest['user_id'])
+                on_done(digest)
+            return len(digests)
+
+        with patch.object(birthday_digest, 'AsyncDBSession', MagicMock()), \
+                patch.object(birthday_digest.repos_contacts, 'get_nearest_bdays_of_all_users', get_rows), \
+                patch.object(birthday_digest, 'send_birthday_digests', send):
+            with self.assertRaises(ConnectionError):
+                await birthday_digest.run(days=7, batch_size=2, checkpoint=self.checkpoint)
+            self.assertEqual(birthday_digest.load_checkpoint(self.checkpoint, datetime.date.today()), 1)
+
+            await birthday_digest.run(days=7, batch_size=2, checkpoint=self.checkpoint)
+            self.assertEqual(sent, [1, 2, 3])
+            self.assertEqual(birthday_digest.load_checkpoint(self.checkpoint, datetime.date.today()), 3)
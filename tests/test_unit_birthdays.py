@@ -0,0 +1,30 @@
+import datetime
+import unittest
+
+import numpy as np
+
+from src.database.models import Contact
+from src.repository.contacts import nearest_bdays
+from src.services.birthdays import birth_mmdd, upcoming_birthdays
+
+
+class TestBirthdays(unittest.TestCase):
+    def test_birth_mmdd(self):
+        dates = np.array(['1990-01-02', '2000-02-29', '1985-12-31'], dtype='datetime64[D]')
+        self.assertEqual(birth_mmdd(dates).tolist(), [102, 229, 1231])
+
+    def test_upcoming_birthdays_grouped_by_user(self):
+        user_ids = np.array([2, 1, 2, 1])
+        dates = np.array(['1990-01-02', '1991-01-01', '1992-06-01', '1993-12-31'], dtype='datetime64[D]')
+        result = upcoming_birthdays(user_ids, dates, today=datetime.date(2023, 12, 30))
+        self.assertEqual(result.tolist(), [1, 3, 0])
+
+    def test_matches_nearest_bdays(self):
+        rng = np.random.default_rng(0)
+        dates = np.datetime64('1950-01-01') + rng.integers(0, 365 * 60, size=2000).astype('timedelta64[D]')
+        user_ids = np.zeros(len(dates), dtype=np.int64)
+        today = datetime.date(2024, 2, 25)
+        contacts = [Contact(birth_date=day.item()) for day in dates]
+        matched = {id(contact) for contact in nearest_bdays(contacts, 10, today)}
+        expected = [i for i, contact in enumerate(contacts) if id(contact) in matched]
+        self.assertEqual(upcoming_birthdays(user_ids, dates, 10, today).tolist(), expected)
@@ -0,0 +1,45 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, call, patch
+
+from redis.exceptions import RedisError
+
+from src.services.cache import LISTEN_TIMEOUT, listen_channel
+
+
+class TestListenChannel(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.pubsub = AsyncMock()
+        self.pubsub.__aenter__.return_value = self.pubsub
+        self.redis = MagicMock()
+        self.redis.pubsub.return_value = self.pubsub
+        patcher = patch("src.services.cache.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.handler = AsyncMock()
+
+    async def test_messages_passed_to_handler(self):
+        on_subscribe = AsyncMock()
+        self.pubsub.get_message.side_effect = [{"type": "message", "data": b"1"}, None, asyncio.CancelledError()]
+        with self.assertRaises(asyncio.CancelledError):
+            await listen_channel("channel", self.handler, on_subscribe=on_subscribe)
+        self.pubsub.subscribe.assert_awaited_once_with("channel")
+        on_subscribe.assert_awaited_once()
+        self.assertEqual(self.handler.await_args_list, [call(b"1"), call(None)])
+        self.pubsub.get_message.assert_awaited_with(ignore_subscribe_messages=True, timeout=LISTEN_TIMEOUT)
+
+    async def test_reconnects_after_redis_error(self):
+        on_disconnect = MagicMock()
+        self.pubsub.get_message.side_effect = [RedisError("Connection closed"), {"type": "message", "data": b"2"},
+                                               asyncio.CancelledError()]
+        with patch("src.services.cache.asyncio.sleep", AsyncMock()), \
+                self.assertLogs('src.services.cache', level='WARNING'), \
+                self.assertRaises(asyncio.CancelledError):
+            await listen_channel("channel", self.handler, on_disconnect=on_disconnect)
+        on_disconnect.assert_called_once_with()
+        self.assertEqual(self.pubsub.subscribe.await_count, 2)
+        self.handler.assert_awaited_once_with(b"2")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+
+from src.services.fuzzy import trigrams, word_similarity, digits, TrigramIndex
+
+
+class TestFuzzy(unittest.TestCase):
+    def test_trigrams_like_pg_trgm(self):
+        self.assertEqual(trigrams("Cat"), {"  c", " ca", "cat", "at "})
+
+    def test_word_similarity(self):
+        self.assertEqual(word_similarity(trigrams("cat"), trigrams("black cat")), 1.0)
+        self.assertEqual(word_similarity(set(), trigrams("cat")), 0.0)
+
+    def test_digits(self):
+        self.assertEqual(digits("+38 (067) 123-45-67"), "380671234567")
+        self.assertEqual(digits(None), "")
+
+    def test_index_ranks_best_match_first(self):
+        index = TrigramIndex(threshold=0.3)
+        index.add(1, ["Johnny", "Walker"], "+380671234567")
+        index.add(2, ["John", "Wayne"], "+380501112233")
+        index.add(3, ["Mary", "Smith"], None)
+        self.assertEqual([key for key, _ in index.search("john")], [2, 1])
+        self.assertEqual(index.search("1234"), [(1, 1.0)])
+        self.assertEqual(index.search("john", limit=1)[0][0], 2)
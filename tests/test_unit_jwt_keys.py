@@ -0,0 +1,74 @@
+import time
+import unittest
+
+import rsa
+from jose import JWTError, jwt
+
+from src.services.jwt_keys import KeyRing
+
+
+def private_pem() -> str:
+    _, private_key = rsa.newkeys(1024)
+    return private_key.save_pkcs1().decode()
+
+
+def public_pem(private_key: str) -> str:
+    key = rsa.PrivateKey.load_pkcs1(private_key.encode())
+    return rsa.PublicKey(key.n, key.e).save_pkcs1().decode()
+
+
+class TestKeyRing(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.old_key = private_pem()
+        cls.new_key = private_pem()
+
+    def claims(self) -> dict:
+        return {"sub": "test@mail.com", "exp": int(time.time()) + 60}
+
+    def test_symmetric_without_kid(self):
+        ring = KeyRing("HS256", "secret")
+        token = ring.sign(self.claims())
+        self.assertNotIn("kid", jwt.get_unverified_header(token))
+        self.assertEqual(ring.verify(token)["sub"], "test@mail.com")
+        self.assertEqual(ring.jwks(), {"keys": []})
+
+    def test_asymmetric_sets_kid(self):
+        ring = KeyRing("RS256", "secret", self.new_key, "new")
+        token = ring.sign(self.claims())
+        self.assertEqual(jwt.get_unverified_header(token)["kid"], "new")
+        self.assertEqual(ring.verify(token)["sub"], "test@mail.com")
+
+    def test_rotation_accepts_published_keys(self):
+        old_ring = KeyRing("RS256", "secret", self.old_key, "old")
+        new_ring = KeyRing("RS256", "secret", self.new_key, "new", {"old": public_pem(self.old_key)})
+        self.assertEqual(new_ring.verify(old_ring.sign(self.claims()))["sub"], "test@mail.com")
+        with self.assertRaises(JWTError):
+            old_ring.verify(new_ring.sign(self.claims()))
+
+    def test_foreign_tokens_rejected(self):
+        ring = KeyRing("RS256", "secret", self.new_key, "new")
+        token = jwt.encode(self.claims(), self.old_key, algorithm="RS256", headers={"kid": "new"})
+        with self.assertRaises(JWTError):
+            ring.verify(token)
+        with self.assertRaises(JWTError):
+            ring.verify(jwt.encode(self.claims(), "secret", algorithm="HS256"))
+
+    def test_jwks_has_only_public_parts(self):
+        retired_key = private_pem()
+        ring = KeyRing("RS256", "secret", self.new_key, "new",
+                       {"old": public_pem(self.old_key), "retired": retired_key})
+        keys = {key["kid"]: key for key in ring.jwks()["keys"]}
+        self.assertEqual(set(keys), {"old", "retired", "new"})
+        for key in keys.values():
+            self.assertEqual(set(key), {"alg", "kty", "n", "e", "kid", "use"})
+            self.assertNotIn("d", key)
+
+    def test_published_private_key_verifies(self):
+        old_ring = KeyRing("RS256", "secret", self.old_key, "old")
+        new_ring = KeyRing("RS256", "secret", self.new_key, "new", {"old": self.old_key})
+        self.assertEqual(new_ring.verify(old_ring.sign(self.claims()))["sub"], "test@mail.com")
+
+    def test_private_key_required(self):
+        with self.assertRaises(ValueError):
+            KeyRing("RS256", "secret")
@@ -0,0 +1,44 @@
+import asyncio
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from src.services.passwords import PasswordHasher, build_context
+
+
+class TestPasswordHasher(unittest.IsolatedAsyncioTestCase):
+    async def test_hash_and_verify(self):
+        hasher = PasswordHasher(ThreadPoolExecutor(max_workers=1), max_pending=2)
+        hashed = await hasher.hash("123456789")
+        self.assertEqual(await hasher.verify_and_update("123456789", hashed), (True, None))
+        self.assertEqual(await hasher.verify_and_update("wrong_password", hashed), (False, None))
+        self.assertEqual(hasher.stats()['completed'], 3)
+        self.assertEqual(hasher.stats()['pending'], 0)
+
+    async def test_rejects_when_queue_full(self):
+        release = threading.Event()
+        hasher = PasswordHasher(ThreadPoolExecutor(max_workers=1), max_pending=1)
+        blocked = asyncio.create_task(hasher.run(release.wait))
+        await asyncio.sleep(0)
+        with self.assertRaises(HTTPException) as error:
+            await hasher.run(release.wait)
+        self.assertEqual(error.exception.status_code, 503)
+        release.set()
+        await blocked
+        self.assertEqual(hasher.stats()['rejected'], 1)
+
+
+class TestPasswordContext(unittest.TestCase):
+    def test_outdated_hash_upgraded(self):
+        old_hash = build_context(['bcrypt'], 4, 1, 8, 1).hash("123456789")
+        context = build_context(['argon2', 'bcrypt'], 5, 1, 8, 1)
+        valid, new_hash = context.verify_and_update("123456789", old_hash)
+        self.assertTrue(valid)
+        self.assertTrue(new_hash.startswith('$argon2'))
+        self.assertEqual(context.verify_and_update("123456789", new_hash), (True, None))
+
+    def test_weaker_bcrypt_rounds_upgraded(self):
+        old_hash = build_context(['bcrypt'], 4, 1, 8, 1).hash("123456789")
+        self.assertTrue(build_context(['bcrypt'], 5, 1, 8, 1).needs_update(old_hash))
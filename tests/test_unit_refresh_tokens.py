@@ -0,0 +1,47 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import HTTPException
+
+from src.services.refresh_tokens import RefreshTokenStore, ROTATE_SCRIPT, REUSED_TOKEN, UNKNOWN_FAMILY
+
+
+class TestRefreshTokenStore(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.store = RefreshTokenStore(ttl=604800)
+        self.redis = MagicMock()
+        self.redis.set = AsyncMock()
+        self.redis.delete = AsyncMock()
+        self.rotate = AsyncMock()
+        self.redis.register_script.return_value = self.rotate
+        patcher = patch("src.services.refresh_tokens.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_start_family(self):
+        claims = await self.store.start()
+        self.assertEqual(claims["gen"], 0)
+        self.redis.set.assert_awaited_once_with(f"refresh:{claims['fam']}", 0, ex=604800)
+
+    async def test_rotate_latest_generation(self):
+        self.rotate.return_value = 3
+        claims = await self.store.rotate("family", 2)
+        self.assertEqual(claims, {"fam": "family", "gen": 3})
+        self.redis.register_script.assert_called_once_with(ROTATE_SCRIPT)
+        self.rotate.assert_awaited_once_with(keys=["refresh:family"], args=[2, 604800])
+
+    async def test_rotate_rejected(self):
+        for result in (UNKNOWN_FAMILY, REUSED_TOKEN):
+            self.rotate.return_value = result
+            with self.assertRaises(HTTPException) as error:
+                await self.store.rotate("family", 1)
+            self.assertEqual(error.exception.status_code, 401)
+
+    async def test_rotate_token_without_family(self):
+        with self.assertRaises(HTTPException):
+            await self.store.rotate(None, None)
+        self.rotate.assert_not_awaited()
+
+    async def test_revoke(self):
+        await self.store.revoke("family")
+        self.redis.delete.assert_awaited_once_with("refresh:family")
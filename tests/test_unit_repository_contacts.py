@@ -1,8 +1,10 @@
 import unittest
 import datetime
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from sqlalchemy.orm import Session
+from fastapi import HTTPException
+
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import Contact, User
 from src.schemas import ContactModel, UserModel
@@ -10,7 +12,12 @@ from src.repository.contacts import (
     get_contacts,
     get_contact,
     get_nearest_bdays,
+    nearest_bdays,
+    bday_window,
     get_contact_by_field,
+    search_contacts,
+    fuzzy_search_contacts,
+    export_row,
     create,
     remove,
     update
@@ -19,23 +26,35 @@ from src.repository.contacts import (
 
 class TestContacts(unittest.IsolatedAsyncioTestCase):
     def setUp(self) -> None:
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
         self.user = User(id=1)
+        patcher = patch("src.repository.contacts.autocomplete_index.broadcast")
+        self.broadcast = patcher.start()
+        self.addCleanup(patcher.stop)
 
     async def test_get_contacts(self):
         contacts = [Contact(), Contact(), Contact()]
-        self.session.query().filter_by().all.return_value = contacts
+        self.session.scalars.return_value = MagicMock(**{'all.return_value': contacts})
         result = await get_contacts(current_user=self.user, db=self.session)
         self.assertEqual(result, contacts)
 
+    async def test_get_contacts_page(self):
+        self.session.scalars.return_value = MagicMock(**{'all.return_value': []})
+        await get_contacts(current_user=self.user, db=self.session, limit=51, after_id=100)
+        query = self.session.scalars.call_args.args[0].compile()
+        sql = " ".join(str(query).split())
+        self.assertIn("contacts.user_id = :user_id_1 AND contacts.id > :id_1", sql)
+        self.assertTrue(sql.endswith("ORDER BY contacts.id LIMIT :param_1"), sql)
+        self.assertEqual(query.params, {'user_id_1': 1, 'id_1': 100, 'param_1': 51})
+
     async def test_get_contact_found(self):
         contact = Contact()
-        self.session.query().filter_by().filter_by().first.return_value = contact
+        self.session.scalar.return_value = contact
         result = await get_contact(contact_id=1, current_user=self.user, db=self.session)
         self.assertEqual(result, contact)
 
     async def test_get_contact_not_found(self):
-        self.session.query().filter_by().filter_by().first.return_value = None
+        self.session.scalar.return_value = None
         result = await get_contact(contact_id=1, current_user=self.user, db=self.session)
         self.assertIsNone(result)
 
@@ -51,16 +70,18 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result.email, body.email)
         self.assertEqual(result.phone, body.phone)
         self.assertEqual(result.birth_date, body.birth_date)
+        self.assertEqual(result.birth_mmdd, 1217)
         self.assertTrue(hasattr(result, "id"))
 
     async def test_remove_contact_found(self):
         contact = Contact()
-        self.session.query().filter_by().filter_by().first.return_value = contact
+        self.session.scalar.return_value = contact
         result = await remove(current_user=self.user, contact_id=1, db=self.session)
+        self.broadcast.assert_awaited_once_with(self.user.id)
         self.assertEqual(result, contact)
 
     async def test_remove_contact_not_found(self):
-        self.session.query().filter_by().filter_by().first.return_value = None
+        self.session.scalar.return_value = None
         result = await remove(current_user=self.user, contact_id=1, db=self.session)
         self.assertIsNone(result)
 
@@ -71,9 +92,10 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
                             phone="+380678965476",
                             birth_date="2004-12-17")
         contact = Contact()
-        self.session.query().filter_by().filter_by().first.return_value = contact
+        self.session.scalar.return_value = contact
         result = await update(current_user=self.user, contact_id=1, body=body, db=self.session)
         self.assertEqual(result, contact)
+        self.assertEqual(result.birth_mmdd, 1217)
 
     async def test_update_contact_not_found(self):
         body = ContactModel(first_name="Mykola",
@@ -81,7 +103,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
                             email="mykola@mail.com",
                             phone="+380678965476",
                             birth_date="2004-12-17")
-        self.session.query().filter_by().filter_by().first.return_value = None
+        self.session.scalar.return_value = None
         result = await update(current_user=self.user, contact_id=1, body=body, db=self.session)
         self.assertIsNone(result)
 
@@ -98,8 +120,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
             Contact(first_name='John', last_name="Wayne", email="test", phone="123456789101112",
                     birth_date=datetime.date.today() + datetime.timedelta(days=5)),
         ]
-        self.session.query.return_value.filter_by.return_value.all.return_value = contacts
-        result = await get_nearest_bdays(current_user=self.user, db=self.session)
+        result = nearest_bdays(contacts)
 
         expected_result = [contacts[0], contacts[2], contacts[4]]
         self.assertEqual(result, expected_result)
@@ -117,10 +138,35 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
             Contact(first_name='John', last_name="Wayne", email="test", phone="123456789101112",
                     birth_date=datetime.date(1980, 5, 30)),
         ]
-        self.session.query.return_value.filter_by.return_value.all.return_value = contacts_not_found
-        result = await get_nearest_bdays(current_user=self.user, db=self.session)
+        result = nearest_bdays(contacts_not_found, today=datetime.date(2023, 10, 1))
 
-        return result == []
+        self.assertEqual(result, [])
+
+    async def test_nearest_bdays_year_wrap(self):
+        contacts = [
+            Contact(first_name='John', last_name="Wayne", email="test", phone="123456789101112",
+                    birth_date=datetime.date(1990, 1, 2)),
+            Contact(first_name='John', last_name="Wayne", email="test", phone="123456789101112",
+                    birth_date=datetime.date(1990, 1, 20)),
+        ]
+        result = nearest_bdays(contacts, today=datetime.date(2023, 12, 30))
+        self.assertEqual(result, [contacts[0]])
+
+    async def test_nearest_bdays_leap_day(self):
+        contact = Contact(first_name='John', last_name="Wayne", email="test", phone="123456789101112",
+                          birth_date=datetime.date(2000, 2, 29))
+        self.assertEqual(nearest_bdays([contact], days=3, today=datetime.date(2023, 2, 27)), [contact])
+        self.assertEqual(nearest_bdays([contact], days=1, today=datetime.date(2024, 2, 28)), [contact])
+        self.assertEqual(nearest_bdays([contact], days=1, today=datetime.date(2024, 2, 29)), [])
+
+    async def test_bday_window(self):
+        self.assertEqual(bday_window(3, today=datetime.date(2023, 12, 30)), [1231, 101, 102])
+
+    async def test_get_nearest_bdays(self):
+        contacts = [Contact(), Contact()]
+        self.session.scalars.return_value = MagicMock(**{'all.return_value': contacts})
+        result = await get_nearest_bdays(current_user=self.user, db=self.session, days=14)
+        self.assertEqual(result, contacts)
 
     async def test_get_contacts_by_field(self):
         contacts = [
@@ -136,9 +182,39 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
                     birth_date=datetime.date(1980, 5, 30)),
         ]
 
-        self.session.query.return_value.filter_by.return_value.filter.return_value.all.return_value = [contacts[0],
-                                                                                                       contacts[3]]
+        self.session.scalars.return_value = MagicMock(**{'all.return_value': [contacts[0], contacts[3]]})
         result = await get_contact_by_field(current_user=self.user, field_name='email', field_value='test_1',
                                             db=self.session)
         expected_result = [contacts[0], contacts[3]]
         self.assertEqual(result, expected_result)
+
+    def test_export_row(self):
+        contact = Contact(id=7, first_name='John', last_name="Wayne", email="test", phone="123456789101112",
+                          birth_date=datetime.datetime(1990, 5, 18), user=self.user)
+        result = export_row(contact)
+        self.assertEqual(result, {"id": 7, "first_name": "John", "last_name": "Wayne", "email": "test",
+                                  "phone": "123456789101112", "birth_date": "1990-05-18"})
+
+    async def test_get_contacts_by_field_not_searchable(self):
+        with self.assertRaises(HTTPException):
+            await get_contact_by_field(current_user=self.user, field_name='user', field_value='1', db=self.session)
+
+    async def test_search_contacts(self):
+        contacts = [Contact(), Contact()]
+        self.session.scalars.return_value = MagicMock(**{'all.return_value': contacts})
+        result = await search_contacts(current_user=self.user, q='Jo_', db=self.session, fields=('first_name',))
+        self.assertEqual(result, contacts)
+        query = self.session.scalars.call_args.args[0]
+        self.assertEqual(query.compile().params['lower_1'], 'jo\\_%')
+
+    async def test_fuzzy_search_contacts_fallback(self):
+        contacts = [
+            Contact(first_name='John', last_name="Wayne", email="john@mail.com", phone="+380678965476"),
+            Contact(first_name='Mary', last_name="Smith", email="mary@mail.com", phone="+380501112233"),
+        ]
+        self.session.bind = MagicMock(**{'dialect.name': 'sqlite'})
+        self.session.scalars.return_value = contacts
+        self.assertEqual(await fuzzy_search_contacts(current_user=self.user, q='Johm', db=self.session), [contacts[0]])
+        self.assertEqual(await fuzzy_search_contacts(current_user=self.user, q='111 22', db=self.session),
+                         [contacts[1]])
+        self.assertEqual(await fuzzy_search_contacts(current_user=self.user, q='xyz', db=self.session), [])
@@ -0,0 +1,81 @@
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from src.services.revocation import BloomFilter, RevocationList
+
+
+class TestBloomFilter(unittest.TestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for number in range(1000):
+            bloom.add(f"jti-{number}")
+        self.assertTrue(all(f"jti-{number}" in bloom for number in range(1000)))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for number in range(1000):
+            bloom.add(f"jti-{number}")
+        false_positives = sum(f"other-{number}" in bloom for number in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class TestRevocationList(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.revocations = RevocationList(capacity=1000, error_rate=0.01, rebuild_interval=3600)
+        self.redis = AsyncMock()
+        patcher = patch("src.services.revocation.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_revoke_until_expiration(self):
+        await self.revocations.revoke("jti", time.time() + 60)
+        key, value = self.redis.set.call_args.args
+        self.assertEqual(key, "revoked:jti")
+        self.assertIn(self.redis.set.call_args.kwargs["ex"], (60, 61))
+        self.redis.publish.assert_awaited_once_with("token:revoke", "jti")
+        self.assertIn("jti", self.revocations.bloom)
+
+    async def test_expired_token_not_stored(self):
+        await self.revocations.revoke("jti", time.time() - 1)
+        self.redis.set.assert_not_awaited()
+
+    async def test_unknown_token_checked_without_io_when_ready(self):
+        self.revocations.ready = True
+        self.assertFalse(await self.revocations.is_revoked("jti"))
+        self.redis.exists.assert_not_awaited()
+
+    async def test_filter_match_confirmed_in_redis(self):
+        self.revocations.ready = True
+        self.revocations.bloom.add("jti")
+        self.redis.exists.return_value = 0
+        self.assertFalse(await self.revocations.is_revoked("jti"))
+        self.redis.exists.return_value = 1
+        self.assertTrue(await self.revocations.is_revoked("jti"))
+
+    async def test_redis_asked_until_ready(self):
+        self.redis.exists.return_value = 1
+        self.assertTrue(await self.revocations.is_revoked("jti"))
+
+    async def test_rebuild_and_published_ids(self):
+        async def scan_iter(match, count):
+            yield b"revoked:stored"
+
+        self.redis.scan_iter = MagicMock(side_effect=scan_iter)
+        await self.revocations.rebuild()
+        await self.revocations.on_revocation(b"published")
+        self.assertTrue(self.revocations.ready)
+        self.assertIn("stored", self.revocations.bloom)
+        self.assertIn("published", self.revocations.bloom)
+        self.redis.scan_iter.assert_called_once()
+
+    async def test_periodic_rebuild(self):
+        async def scan_iter(match, count):
+            yield b"revoked:stored"
+
+        self.redis.scan_iter = MagicMock(side_effect=scan_iter)
+        self.revocations.rebuild_interval = 0
+        await self.revocations.on_revocation(None)
+        self.assertIn("stored", self.revocations.bloom)
+        self.revocations.on_disconnect()
+        self.assertFalse(self.revocations.ready)
@@ -0,0 +1,78 @@
+import json
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import HTTPException
+
+from src.database.models import Contact
+from src.routes.contacts import csv_chunks, decode_cursor, encode_cursor, get_contacts, ndjson_chunks
+
+
+class TestContactsPagination(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.session = MagicMock()
+        self.user = MagicMock(id=1)
+        self.contacts = [Contact(id=contact_id) for contact_id in range(1, 6)]
+
+        async def get_page(current_user, db, limit, after_id):
+            return [contact for contact in self.contacts if after_id is None or contact.id > after_id][:limit]
+
+        self.get_page = AsyncMock(side_effect=get_page)
+        patcher = patch("src.routes.contacts.repos_contacts.get_contacts", self.get_page)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cursor_round_trip(self):
+        for contact_id in (1, 42, 2 ** 40):
+            self.assertEqual(decode_cursor(encode_cursor(contact_id)), contact_id)
+
+    def test_malformed_cursor(self):
+        for cursor in ("not a cursor", "YWJj", "é"):
+            with self.assertRaises(HTTPException) as error:
+                decode_cursor(cursor)
+            self.assertEqual(error.exception.status_code, 400)
+
+    async def test_pages(self):
+        page = await get_contacts(limit=2, cursor=None, db=self.session, current_user=self.user)
+        self.get_page.assert_awaited_with(self.user, self.session, limit=3, after_id=None)
+        self.assertEqual([contact.id for contact in page['items']], [1, 2])
+        self.assertEqual(decode_cursor(page['next_cursor']), 2)
+
+        page = await get_contacts(limit=2, cursor=page['next_cursor'], db=self.session, current_user=self.user)
+        self.get_page.assert_awaited_with(self.user, self.session, limit=3, after_id=2)
+        self.assertEqual([contact.id for contact in page['items']], [3, 4])
+
+        page = await get_contacts(limit=2, cursor=page['next_cursor'], db=self.session, current_user=self.user)
+        self.assertEqual([contact.id for contact in page['items']], [5])
+        self.assertIsNone(page['next_cursor'])
+
+    async def test_full_last_page(self):
+        page = await get_contacts(limit=5, cursor=None, db=self.session, current_user=self.user)
+        self.assertEqual(len(page['items']), 5)
+        self.assertIsNone(page['next_cursor'])
+
+
+async def batches():
+    yield [{"id": 1, "first_name": "John", "last_name": "Wayne", "email": "john@mail.com", "phone": "123",
+            "birth_date": "1990-05-18"}]
+    yield [{"id": 2, "first_name": "Jane, Mary", "last_name": None, "email": None, "phone": None,
+            "birth_date": None}]
+
+
+class TestExportChunks(unittest.IsolatedAsyncioTestCase):
+    async def test_ndjson_chunk_per_batch(self):
+        chunks = [chunk async for chunk in ndjson_chunks(batches())]
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(json.loads(chunks[0])["first_name"], "John")
+        self.assertEqual(json.loads(chunks[1])["last_name"], None)
+        self.assertTrue(all(chunk.endswith("\n") for chunk in chunks))
+
+    async def test_csv_header_then_chunk_per_batch(self):
+        chunks = [chunk async for chunk in csv_chunks(batches())]
+        self.assertEqual(chunks, ["id,first_name,last_name,email,phone,birth_date\r\n",
+                                  "1,John,Wayne,john@mail.com,123,1990-05-18\r\n",
+                                  '2,"Jane, Mary",,,,\r\n'])
+
+
+if __name__ == '__main__':
+    unittest.main()
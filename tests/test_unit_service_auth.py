@@ -0,0 +1,263 @@
+import pickle
+import time
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from fastapi import HTTPException
+from jose import jwt
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.confg.config import settings
+from src.database.models import User
+from src.services.auth import auth_service
+from src.services.principal import Principal, dump_principal, load_principal, CACHE_VERSION
+from src.services.principal_cache import PrincipalCache, principal_cache
+from src.services.token_cache import VerifiedTokenCache, token_cache
+
+
+class TestAuth(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.session = AsyncMock(spec=AsyncSession)
+        self.user = User(id=1, username="test_name", email="test@mail.com", confirmed=True, avatar="avatar")
+        self.redis = AsyncMock()
+        patcher = patch("src.services.principal_cache.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        principal_cache.local.clear()
+        token_cache.entries.clear()
+        patcher = patch("src.services.auth.revocation_list.is_revoked", return_value=False)
+        self.is_revoked = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_get_current_user_cache_miss(self):
+        token = await auth_service.create_access_token(data={"sub": str(self.user.id)})
+        self.redis.get.return_value = None
+        self.session.get.return_value = self.user
+        result = await auth_service.get_current_user(token=token, db=self.session)
+        self.assertIsInstance(result, Principal)
+        self.assertEqual(result.email, self.user.email)
+        self.redis.set.assert_awaited_once()
+        self.assertEqual(self.redis.set.call_args.kwargs["ex"], settings.principal_cache_ttl)
+        self.assertTrue(self.redis.set.call_args.kwargs["nx"])
+
+    async def test_get_current_user_cache_hit(self):
+        token = await auth_service.create_access_token(data={"sub": str(self.user.id)})
+        self.redis.get.return_value = dump_principal(Principal.from_user(self.user))
+        result = await auth_service.get_current_user(token=token, db=self.session)
+        self.assertEqual(result, Principal(1, "test@mail.com", "test_name", True, "avatar"))
+        self.session.get.assert_not_awaited()
+
+    async def test_get_current_user_legacy_payload_is_a_miss(self):
+        token = await auth_service.create_access_token(data={"sub": str(self.user.id)})
+        self.redis.get.return_value = pickle.dumps({"id": 1})
+        self.session.get.return_value = self.user
+        result = await auth_service.get_current_user(token=token, db=self.session)
+        self.assertEqual(result.id, self.user.id)
+        self.assertEqual(load_principal(self.redis.set.call_args.args[1]), result)
+        self.redis.delete.assert_awaited_once_with("user:1")
+
+    async def test_get_current_user_legacy_email_subject(self):
+        token = await auth_service.create_access_token(data={"sub": self.user.email})
+        self.session.scalar.return_value = self.user
+        result = await auth_service.get_current_user(token=token, db=self.session)
+        self.assertEqual(result.id, self.user.id)
+        self.redis.get.assert_not_awaited()
+        self.session.get.assert_not_awaited()
+
+    async def test_get_token_principal_without_embedded_principal(self):
+        token = await auth_service.create_access_token(data={"sub": str(self.user.id)})
+        self.redis.get.return_value = dump_principal(Principal.from_user(self.user))
+        with patch.object(auth_service, "verify_access_token", wraps=auth_service.verify_access_token) as verify:
+            result = await auth_service.get_token_principal(token=token, db=self.session)
+        self.assertEqual(result, Principal.from_user(self.user))
+        verify.assert_awaited_once_with(token)
+        self.is_revoked.assert_awaited_once()
+
+    async def test_get_token_principal_of_deleted_user(self):
+        token = await auth_service.create_access_token(data={"sub": "999"})
+        self.redis.get.return_value = None
+        self.session.get.return_value = None
+        with self.assertRaises(HTTPException) as error:
+            await auth_service.get_token_principal(token=token, db=self.session)
+        self.assertEqual(error.exception.status_code, 401)
+
+    def test_principal_payload_versioned(self):
+        principal = Principal.from_user(self.user)
+        payload = dump_principal(principal)
+        self.assertEqual(load_principal(payload), principal)
+        self.assertIsNone(load_principal(payload.replace(f"[{CACHE_VERSION},".encode(), b"[0,")))
+        self.assertNotIn(b"password", payload)
+
+    async def test_get_current_user_refresh_token_rejected(self):
+        token = await auth_service.create_refresh_token(data={"sub": str(self.user.id)})
+        with self.assertRaises(HTTPException) as error:
+            await auth_service.get_current_user(token=token, db=self.session)
+        self.assertEqual(error.exception.status_code, 401)
+
+    async def test_get_current_user_local_hit(self):
+        token = await auth_service.create_access_token(data={"sub": str(self.user.id)})
+        self.redis.get.return_value = dump_principal(Principal.from_user(self.user))
+        first = await auth_service.get_current_user(token=token, db=self.session)
+        second = await auth_service.get_current_user(token=token, db=self.session)
+        self.assertIs(first, second)
+        self.redis.get.assert_awaited_once()
+
+    async def test_access_token_verified_once(self):
+        token = await auth_service.create_access_token(data={"sub": str(self.user.id)})
+        with patch("src.services.jwt_keys.jwt.decode", wraps=jwt.decode) as decode:
+            first = auth_service.decode_access_token(token)
+            second = auth_service.decode_access_token(token)
+        self.assertEqual(first, second)
+        decode.assert_called_once()
+
+    async def test_tampered_token_not_served_from_cache(self):
+        token = await auth_service.create_access_token(data={"sub": str(self.user.id)})
+        auth_service.decode_access_token(token)
+        with self.assertRaises(HTTPException) as error:
+            await auth_service.get_current_user(token=token[:-2] + "xx", db=self.session)
+        self.assertEqual(error.exception.status_code, 401)
+
+    async def test_revoked_access_token_rejected(self):
+        token = await auth_service.create_access_token(data={"sub": str(self.user.id)})
+        self.is_revoked.return_value = True
+        with self.assertRaises(HTTPException) as error:
+            await auth_service.get_current_user(token=token, db=self.session)
+        self.assertEqual(error.exception.status_code, 401)
+        self.assertEqual(self.is_revoked.call_args.args[0], jwt.get_unverified_claims(token)["jti"])
+
+    async def test_revoke_access_token(self):
+        token = await auth_service.create_access_token(data={"sub": str(self.user.id)})
+        claims = jwt.get_unverified_claims(token)
+        with patch("src.services.auth.revocation_list.revoke") as revoke:
+            await auth_service.revoke_access_token(token)
+        revoke.assert_awaited_once_with(claims["jti"], claims["exp"])
+
+    async def test_token_principal_without_io(self):
+        with patch.object(settings, "stateless_principal", True):
+            claims = {"sub": str(self.user.id), **auth_service.principal_claims(self.user)}
+        token = await auth_service.create_access_token(data=claims)
+        result = await auth_service.get_token_principal(token=token, db=self.session)
+        self.assertEqual(result, Principal(1, "test@mail.com", "test_name", True, None))
+        self.redis.get.assert_not_awaited()
+        self.session.get.assert_not_awaited()
+
+    async def test_token_principal_outdated_version_rejected(self):
+        with patch.object(settings, "stateless_principal", True):
+            claims = {"sub": str(self.user.id), **auth_service.principal_claims(self.user)}
+        token = await auth_service.create_access_token(data=claims)
+        with patch.object(settings, "principal_token_version", settings.principal_token_version + 1):
+            with self.assertRaises(HTTPException) as error:
+                await auth_service.get_token_principal(token=token, db=self.session)
+        self.assertEqual(error.exception.status_code, 401)
+
+    async def test_token_principal_falls_back_to_lookup(self):
+        self.assertEqual(auth_service.principal_claims(self.user), {})
+        token = await auth_service.create_access_token(data={"sub": str(self.user.id)})
+        self.redis.get.return_value = None
+        self.session.get.return_value = self.user
+        result = await auth_service.get_token_principal(token=token, db=self.session)
+        self.assertEqual(result.avatar, "avatar")
+        self.session.get.assert_awaited_once()
+
+
+class TestVerifiedTokenCache(unittest.TestCase):
+    def test_expired_claims_dropped(self):
+        cache = VerifiedTokenCache(max_size=10)
+        cache.put("token", {"sub": "test@mail.com", "exp": time.time() - 1})
+        self.assertIsNone(cache.get("token"))
+        self.assertEqual(cache.stats(), {"size": 0, "hits": 0, "misses": 1})
+
+    def test_lru_eviction(self):
+        cache = VerifiedTokenCache(max_size=1)
+        cache.put("first", {"exp": time.time() + 60})
+        cache.put("second", {"exp": time.time() + 60})
+        self.assertIsNone(cache.get("first"))
+        self.assertIsNotNone(cache.get("second"))
+
+
+class TestPrincipalCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.cache = PrincipalCache(max_size=2, local_ttl=30, redis_ttl=900)
+        self.redis = AsyncMock()
+        self.redis.get.return_value = None
+        patcher = patch("src.services.principal_cache.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def principal(number: int) -> Principal:
+        return Principal(number, f"user{number}@mail.com", f"user{number}", True, None)
+
+    async def test_lru_eviction(self):
+        for number in range(3):
+            await self.cache.set(self.principal(number))
+        self.assertEqual(list(self.cache.local), [1, 2])
+        self.assertIsNone(await self.cache.get(0))
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    async def test_expired_local_entry_goes_to_redis(self):
+        self.cache.local_ttl = -1
+        await self.cache.set(self.principal(1))
+        self.redis.get.return_value = dump_principal(self.principal(1))
+        self.assertEqual(await self.cache.get(1), self.principal(1))
+        self.assertEqual(self.cache.stats()["redis_hits"], 1)
+
+    async def test_invalidate_publishes(self):
+        await self.cache.set(self.principal(1))
+        await self.cache.invalidate(1)
+        self.assertNotIn(1, self.cache.local)
+        self.redis.delete.assert_awaited_once_with("user:1")
+        self.redis.publish.assert_awaited_once_with("user:invalidate", 1)
+
+    async def test_invalidate_without_redis_drops_local_copy(self):
+        await self.cache.set(self.principal(1))
+        self.redis.delete.side_effect = RedisError("Connection refused")
+        with self.assertLogs('src.services.principal_cache', level='WARNING'):
+            await self.cache.invalidate(1)
+        self.assertNotIn(1, self.cache.local)
+
+    async def test_refresh_writes_through(self):
+        await self.cache.set(self.principal(1))
+        changed = Principal(1, "user1@mail.com", "user1", True, "new_avatar")
+        await self.cache.refresh(changed)
+        self.assertEqual(self.cache.local[1][0], changed)
+        self.assertEqual(self.redis.set.call_args.args, ("user:1", dump_principal(changed)))
+        self.assertEqual(self.redis.set.call_args.kwargs["ex"], 900)
+        self.redis.publish.assert_awaited_once_with("user:invalidate", 1)
+
+    async def test_refresh_without_redis_invalidates(self):
+        await self.cache.set(self.principal(1))
+        self.redis.set.side_effect = RedisError("Too many connections")
+        with self.assertLogs('src.services.principal_cache', level='WARNING'):
+            await self.cache.refresh(Principal(1, "user1@mail.com", "user1", True, "new_avatar"))
+        self.assertNotIn(1, self.cache.local)
+        self.redis.delete.assert_awaited_once_with("user:1")
+        self.redis.publish.assert_awaited_once_with("user:invalidate", 1)
+
+    async def test_invalidations_drop_changed_users(self):
+        await self.cache.set(self.principal(1))
+        await self.cache.set(self.principal(2))
+        await self.cache.on_invalidation(None)
+        await self.cache.on_invalidation(b"1")
+        self.assertEqual(list(self.cache.local), [2])
+
+    async def test_stale_fill_does_not_overwrite_refresh(self):
+        store = {}
+
+        async def redis_set(key, value, ex=None, nx=False):
+            if nx and key in store:
+                return None
+            store[key] = value
+            return True
+
+        self.redis.set.side_effect = redis_set
+        self.redis.get.side_effect = store.get
+        stale = self.principal(1)
+        changed = Principal(1, "user1@mail.com", "user1", True, "new_avatar")
+        # A request read the old row, then the avatar update committed and wrote through
+        await self.cache.refresh(changed)
+        self.cache.local.clear()
+        await self.cache.fill(stale)
+        self.assertEqual(load_principal(store["user:1"]), changed)
+        self.assertEqual(await self.cache.get(1), changed)
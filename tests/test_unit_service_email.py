@@ -0,0 +1,63 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from aiosmtplib import SMTPRecipientsRefused, SMTPRecipientRefused
+
+from src.services import email
+
+
+def digest(user_id):
+    return {"email": f"user{user_id}@mail.com", "username": f"user_{user_id}",
+            "contacts": [{"first_name": "John", "last_name": "Wayne", "birth_date": "18.05"}]}
+
+
+class TestBirthdayDigests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.connection = MagicMock()
+        self.connection.session.send_message = AsyncMock()
+        self.connection.__aenter__ = AsyncMock(return_value=self.connection)
+        self.connection.__aexit__ = AsyncMock(return_value=None)
+        self.connection_class = MagicMock(return_value=self.connection)
+
+    async def test_batch_uses_one_session(self):
+        with patch.object(email, 'Connection', self.connection_class), \
+                patch.object(email.conf, 'SUPPRESS_SEND', False):
+            await email.send_birthday_digests([digest(1), digest(2), digest(3)], days=7)
+        self.connection_class.assert_called_once_with(email.conf)
+        self.connection.__aenter__.assert_awaited_once()
+        sent = [call.args[0] for call in self.connection.session.send_message.await_args_list]
+        self.assertEqual([msg['To'] for msg in sent], ["user1@mail.com", "user2@mail.com", "user3@mail.com"])
+
+    async def test_suppress_send(self):
+        dispatched = []
+        with patch.object(email, 'Connection', self.connection_class), \
+                patch.object(email.conf, 'SUPPRESS_SEND', True), \
+                email.email_dispatched.connected_to(dispatched.append):
+            await email.send_birthday_digests([digest(1), digest(2)], days=7)
+        self.connection.session.send_message.assert_not_awaited()
+        self.assertEqual([msg['To'] for msg in dispatched], ["user1@mail.com", "user2@mail.com"])
+
+    async def test_refused_recipient_skipped(self):
+        refused = SMTPRecipientsRefused([SMTPRecipientRefused(550, "No such user", "user2@mail.com")])
+        self.connection.session.send_message.side_effect = [None, refused, None]
+        done = []
+        with patch.object(email, 'Connection', self.connection_class), \
+                patch.object(email.conf, 'SUPPRESS_SEND', False), \
+                self.assertLogs('src.services.email', level='WARNING'):
+            sent = await email.send_birthday_digests([digest(1), digest(2), digest(3)], days=7, on_done=done.append)
+        self.assertEqual(sent, 2)
+        self.assertEqual(self.connection.session.send_message.await_count, 3)
+        self.assertEqual([item["email"] for item in done], ["user1@mail.com", "user2@mail.com", "user3@mail.com"])
+
+    async def test_connection_error_stops_batch(self):
+        self.connection.session.send_message.side_effect = [None, ConnectionError()]
+        done = []
+        with patch.object(email, 'Connection', self.connection_class), \
+                patch.object(email.conf, 'SUPPRESS_SEND', False):
+            with self.assertRaises(ConnectionError):
+                await email.send_birthday_digests([digest(1), digest(2), digest(3)], days=7, on_done=done.append)
+        self.assertEqual([item["email"] for item in done], ["user1@mail.com"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import json
+import unittest
+
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from src.database.slow_query import (fingerprint, install_slow_query_log, request_scope, route_template,
+                                     RequestScopeMiddleware)
+
+
+class TestSlowQuery(unittest.TestCase):
+    def test_fingerprint_ignores_literals_and_whitespace(self):
+        self.assertEqual(fingerprint("SELECT * FROM contacts WHERE id = 1"),
+                         fingerprint("select *  FROM contacts\nWHERE id = 42"))
+        self.assertNotEqual(fingerprint("SELECT * FROM contacts"), fingerprint("SELECT * FROM users"))
+
+    def test_slow_query_logged(self):
+        engine = create_engine("sqlite://")
+        install_slow_query_log(engine, threshold_ms=0)
+        route = APIRoute("/api/contacts/{contact_id}", lambda contact_id: None, methods=["GET"])
+        token = request_scope.set({'type': 'http', 'method': 'GET', 'path': '/api/contacts/7', 'route': route})
+        try:
+            with self.assertLogs('sql.slow_query', level='WARNING') as logs, engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        finally:
+            request_scope.reset(token)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['event'], 'slow_query')
+        self.assertEqual(record['route'], "GET /api/contacts/{contact_id}")
+        self.assertEqual(record['fingerprint'], fingerprint("SELECT 1"))
+
+    def test_fast_query_not_logged(self):
+        engine = create_engine("sqlite://")
+        install_slow_query_log(engine, threshold_ms=10_000)
+        with self.assertNoLogs('sql.slow_query', level='WARNING'), engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    def test_route_template_of_unmatched_request(self):
+        self.assertIsNone(route_template(None))
+        self.assertIsNone(route_template({'type': 'http', 'method': 'GET', 'path': '/no/such/page'}))
+
+    def test_route_resolved_after_routing(self):
+        app = FastAPI()
+        app.add_middleware(RequestScopeMiddleware)
+        records = []
+
+        @app.get("/api/contacts/{contact_id}")
+        async def read_contact(contact_id: int):
+            records.append(route_template(request_scope.get()))
+
+        TestClient(app).get("/api/contacts/42")
+        self.assertEqual(records, ["GET /api/contacts/{contact_id}"])
+        self.assertIsNone(request_scope.get())
@@ -1,37 +1,52 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, patch
 
-from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import Contact, User
 from src.schemas import UserModel
+from src.services.principal import Principal
 
 from src.repository.users import (
     get_user_by_email,
+    get_user_by_id,
     update_avatar,
     create_user,
     update_token,
+    update_password,
     confirmed_email
 )
 
 
 class TestUsers(unittest.IsolatedAsyncioTestCase):
     def setUp(self) -> None:
-        self.session = MagicMock(spec=Session)
-        self.user = User(id=1)
+        self.session = AsyncMock(spec=AsyncSession)
+        self.user = User(id=1, username='test_name', email='test@mail.com', confirmed=False)
+        patcher = patch("src.repository.users.principal_cache.refresh")
+        self.refresh = patcher.start()
+        self.addCleanup(patcher.stop)
 
     async def test_get_user_by_email_found(self):
         user = User()
-        self.session.query().filter().first.return_value = user
+        self.session.scalar.return_value = user
         result = await get_user_by_email(email='test@mail', db=self.session)
         self.assertEqual(result, user)
 
     async def test_get_user_by_email_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.scalar.return_value = None
         result = await get_user_by_email(email='test@mail', db=self.session)
         self.assertIsNone(result)
 
+    async def test_get_user_by_id(self):
+        self.session.get.return_value = self.user
+        result = await get_user_by_id(user_id=1, db=self.session)
+        self.assertEqual(result, self.user)
+        self.session.get.assert_awaited_once_with(User, 1)
+
     async def test_create_user(self):
+        self.session.get_bind.return_value.dialect.name = 'mysql'
         body = UserModel(username='test_name',
                          email='test@mail.com',
                          password='TestPassword',
@@ -43,17 +58,48 @@ class TestUsers(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result.avatar, body.avatar)
         self.assertTrue(hasattr(result, "id"))
 
+    async def test_create_user_conflict_without_upsert(self):
+        self.session.get_bind.return_value.dialect.name = 'mysql'
+        self.session.commit.side_effect = IntegrityError('INSERT', {}, Exception())
+        body = UserModel(username='test_name', email='test@mail.com', password='TestPassword', avatar='testAvatar')
+        self.assertIsNone(await create_user(body=body, db=self.session))
+        self.session.rollback.assert_awaited_once()
+
+    async def test_create_user_upsert(self):
+        self.session.get_bind.return_value.dialect.name = 'postgresql'
+        self.session.scalar.return_value = self.user
+        body = UserModel(username='test_name', email='test@mail.com', password='TestPassword', avatar='testAvatar')
+        result = await create_user(body=body, db=self.session)
+        self.assertEqual(result, self.user)
+        statement = str(self.session.scalar.call_args.args[0].compile(dialect=postgresql.dialect()))
+        self.assertIn('ON CONFLICT DO NOTHING', statement)
+        self.assertIn('RETURNING', statement)
+        self.session.add.assert_not_called()
+
+    async def test_create_user_upsert_conflict(self):
+        self.session.get_bind.return_value.dialect.name = 'postgresql'
+        self.session.scalar.return_value = None
+        body = UserModel(username='test_name', email='test@mail.com', password='TestPassword', avatar='testAvatar')
+        self.assertIsNone(await create_user(body=body, db=self.session))
+
     async def test_update_avatar(self):
-        self.session.query().filter().first.return_value = self.user
+        self.session.scalar.return_value = self.user
         result = await update_avatar(email=self.user.email, url='test.url', db=self.session)
         self.assertEqual(result.avatar, self.user.avatar)
+        self.refresh.assert_awaited_once_with(Principal(1, 'test@mail.com', 'test_name', False, 'test.url'))
 
     async def test_update_token(self):
         await update_token(user=self.user, refresh_token='test_token', db=self.session)
         self.assertEqual(self.user.refresh_token, 'test_token')
 
+    async def test_update_password(self):
+        await update_password(user=self.user, password_hash='new_hash', db=self.session)
+        self.assertEqual(self.user.password, 'new_hash')
+        self.session.commit.assert_awaited()
+
     async def test_confirmed_email(self):
-        self.session.query().filter().first.return_value = self.user
+        self.session.scalar.return_value = self.user
         await confirmed_email(email=self.user.email, db=self.session)
         self.assertTrue(self.user.confirmed)
+        self.assertTrue(self.refresh.call_args.args[0].confirmed)
 